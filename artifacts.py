@@ -0,0 +1,90 @@
+import json
+import os
+import time
+
+import joblib
+import sklearn
+
+from explore import WinePrep
+from flat_forest import FlatForest, compile_forest
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+# Models whose trees are also stored as flat .npy arrays
+FOREST_MODELS = ['RandomForestRegressor', 'ExtraTreesRegressor', 'DecisionTreeRegressor', 'ExtraTreeRegressor']
+
+
+def save_model(model, directory, prep=None):
+    """
+    Save a fitted estimator and its preprocessing metadata to a directory.
+
+    Parameters:
+        model: A fitted estimator, e.g. from `train_model` or `train_hyper`.
+        directory (str): The artifact directory (created if needed).
+        prep (WinePrep, optional): The fitted preprocessing that builds the model's features.
+
+    Note:
+        - meta.json holds the model class, feature columns and the WinePrep state (scaler bounds,
+          centroids, category levels, outlier rules), readable without unpickling anything.
+        - The estimator is stored uncompressed with joblib, so its arrays can be memory-mapped.
+        - Forests are also compiled to raw .npy arrays (see flat_forest.py). scikit-learn copies
+          tree arrays while unpickling, so only the flat arrays really load in constant time and
+          share one copy across processes through the page cache.
+    """
+    os.makedirs(directory, exist_ok=True)
+    model_class = model.__class__.__name__
+
+    joblib.dump(model, os.path.join(directory, 'model.joblib'))
+
+    has_forest = model_class in FOREST_MODELS
+    if has_forest:
+        compile_forest(model).save(os.path.join(directory, 'forest'))
+
+    meta = {
+        'model_class': model_class,
+        'feature_names': list(map(str, model.feature_names_in_)) if hasattr(model, 'feature_names_in_') else None,
+        'has_forest': has_forest,
+        'prep': prep.to_dict() if prep is not None else None,
+        'sklearn_version': sklearn.__version__,
+        'saved_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+
+def load_model(directory, mmap_mode='r', flat=None):
+    """
+    Load an artifact written by `save_model`.
+
+    Parameters:
+        directory (str): The artifact directory.
+        mmap_mode (str, optional): Memory-map large arrays instead of reading them (default is 'r').
+            Pass None to read everything into memory.
+        flat (bool, optional): Return the compiled FlatForest instead of the estimator. Default is
+            None, which returns it whenever the artifact has one.
+
+    Returns:
+        model: The estimator, or a FlatForest with the same `predict`.
+        prep (WinePrep or None): The fitted preprocessing, if one was saved.
+
+    Example:
+        save_model(rforest, 'artifacts/rforest', prep)
+        model, prep = load_model('artifacts/rforest')
+        model.predict(prep.transform(new_rows))
+    """
+    meta = read_meta(directory)
+    prep = WinePrep.from_dict(meta['prep']) if meta['prep'] is not None else None
+
+    if meta['has_forest'] and flat is not False:
+        return FlatForest.load(os.path.join(directory, 'forest'), mmap_mode=mmap_mode), prep
+
+    return joblib.load(os.path.join(directory, 'model.joblib'), mmap_mode=mmap_mode), prep
+
+
+def read_meta(directory):
+    """
+    The metadata of an artifact (model class, columns, preprocessing state), without loading the model.
+    """
+    with open(os.path.join(directory, 'meta.json')) as f:
+        return json.load(f)
@@ -0,0 +1,226 @@
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from sklearn.linear_model import LinearRegression
+from sklearn.ensemble import RandomForestRegressor
+
+from wrangle import acquire_wine
+from explore import data_pipeline, bravo_pipeline, feature_selections_results, hot_encode
+from model import train_model
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+# Where the reference timings live, and the slowdown that counts as a regression
+BASELINE_PATH = 'benchmark_baseline.json'
+THRESHOLD = 0.25
+
+
+def upscale_wine(df, factor, seed=42):
+    """
+    Make a larger copy of the wine data by resampling rows and jittering the measurements.
+
+    Parameters:
+        df (pd.DataFrame): The raw wine data from `acquire_wine`.
+        factor (int): How many times more rows to produce; 1 returns `df` unchanged.
+        seed (int): Random seed (default is 42).
+
+    Returns:
+        pd.DataFrame: `factor` times as many rows, with the same columns and dtypes.
+
+    Note:
+        - Measurements get Gaussian noise of 1% of their standard deviation, so rows are not
+          exact copies (which would flatter duplicate-sensitive steps) but the outlier filter
+          and the cluster structure behave as on the real data.
+    """
+    if factor == 1:
+        return df
+
+    rng = np.random.default_rng(seed)
+    big = df.iloc[rng.integers(0, len(df), len(df) * factor)].reset_index(drop=True)
+
+    # Jitter every measurement, leaving the target and wine type as they are
+    measures = big.select_dtypes(include='number').columns.drop('quality')
+    noise = rng.standard_normal((len(big), len(measures))) * (df[measures].std().to_numpy() * 0.01)
+    big[measures] = big[measures].to_numpy() + noise
+
+    return big
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def _train_linear(splits):
+    X_train, y_train, X_val, y_val, _, _ = splits
+    train_model(LinearRegression, X_train, y_train, X_val, y_val)
+
+
+def _train_forest(splits):
+    # A shallow, small forest keeps the 100x run to minutes
+    X_train, y_train, X_val, y_val, _, _ = splits
+    train_model(partial(RandomForestRegressor, n_estimators=50, max_depth=12, n_jobs=-1, random_state=42),
+                X_train, y_train, X_val, y_val)
+
+
+# Benchmarks by name: a setup step run untimed on the scaled data, and the timed call
+BENCHMARKS = {
+    'data_pipeline': (lambda df: df, lambda df: data_pipeline(df=df)),
+    'bravo_pipeline': (lambda df: df, lambda df: bravo_pipeline(df=df)),
+    'feature_selections_results': (
+        lambda df: hot_encode(df[(df.density <= 1.01) & (df.alcohol <= 14.04)]),
+        lambda df: feature_selections_results(df, 'quality')
+    ),
+    'train_model_linear': (lambda df: data_pipeline(df=df), _train_linear),
+    'train_model_forest': (lambda df: data_pipeline(df=df), _train_forest),
+}
+
+
+def _measure(func, data, repeats):
+    """
+    Best wall time over `repeats` untraced runs, then peak traced memory over one more run.
+    """
+    timings = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        func(data)
+        timings.append(time.perf_counter() - start)
+
+    # Memory is measured on a separate run, since tracing slows allocation down
+    gc.collect()
+    tracemalloc.start()
+    func(data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return min(timings), peak / 1024 ** 2
+
+
+def run_benchmarks(scales=(1, 10, 100), benchmarks=None, repeats=3, seed=42):
+    """
+    Time each public entry point on the wine data and on upscaled copies of it.
+
+    Parameters:
+        scales (tuple): Row multipliers to run at (default is (1, 10, 100)).
+        benchmarks (list, optional): Names from BENCHMARKS. Default is None (all of them).
+        repeats (int): Timed runs per benchmark; the best is kept (default is 3).
+        seed (int): Seed for the upscaled data (default is 42).
+
+    Returns:
+        pd.DataFrame: One row per (benchmark, scale) with rows, best wall time and peak memory.
+    """
+    names = list(BENCHMARKS) if benchmarks is None else benchmarks
+    raw = acquire_wine()
+
+    results = []
+    for scale in scales:
+        df = upscale_wine(raw, scale, seed)
+        for name in names:
+            setup, func = BENCHMARKS[name]
+
+            # Keep the models' and pipelines' printing out of the benchmark output
+            with contextlib.redirect_stdout(io.StringIO()):
+                data = setup(df)
+                wall_s, peak_mb = _measure(func, data, repeats)
+
+            results.append({'benchmark': name, 'scale': scale, 'rows': len(df),
+                            'wall_s': wall_s, 'peak_mb': peak_mb})
+            print(f'{name} at {scale}x: {wall_s:.3f} s, {peak_mb:.1f} MB peak', file=sys.stderr)
+
+    return pd.DataFrame(results)
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def save_baseline(results, path=BASELINE_PATH):
+    """
+    Store benchmark results as the baseline to compare future runs against.
+
+    Parameters:
+        results (pd.DataFrame): The output of `run_benchmarks`.
+        path (str): The baseline file (default is 'benchmark_baseline.json').
+    """
+    with open(path, 'w') as f:
+        json.dump({
+            'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+            'results': results.to_dict(orient='records')
+        }, f, indent=2)
+
+
+def compare_to_baseline(results, path=BASELINE_PATH, threshold=THRESHOLD, min_delta_s=0.01):
+    """
+    Compare benchmark results with the stored baseline and flag slowdowns.
+
+    Parameters:
+        results (pd.DataFrame): The output of `run_benchmarks`.
+        path (str): The baseline file (default is 'benchmark_baseline.json').
+        threshold (float): Relative slowdown that counts as a regression (default is 0.25, i.e. 25%).
+        min_delta_s (float): Ignore slowdowns smaller than this many seconds, since millisecond
+            benchmarks are mostly timer noise (default is 0.01).
+
+    Returns:
+        pd.DataFrame: Current and baseline time and memory with their ratios, and a 'regressed'
+            flag set when time or peak memory grew by more than `threshold`.
+
+    Note:
+        - Timings are only comparable on the machine that recorded the baseline.
+    """
+    with open(path) as f:
+        baseline = pd.DataFrame(json.load(f)['results'])
+
+    comparison = results.merge(baseline[['benchmark', 'scale', 'wall_s', 'peak_mb']],
+                               on=['benchmark', 'scale'], how='left', suffixes=('', '_baseline'))
+    comparison['time_ratio'] = comparison['wall_s'] / comparison['wall_s_baseline']
+    comparison['memory_ratio'] = comparison['peak_mb'] / comparison['peak_mb_baseline']
+    slower = (comparison['time_ratio'] > 1 + threshold) & \
+             (comparison['wall_s'] - comparison['wall_s_baseline'] > min_delta_s)
+    comparison['regressed'] = slower | (comparison['memory_ratio'] > 1 + threshold)
+
+    return comparison
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the wine pipelines at several data scales.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS), default=None)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the new baseline.')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.scales, args.benchmarks, args.repeats)
+
+    if args.save_baseline or not os.path.exists(args.baseline):
+        save_baseline(results, args.baseline)
+        print(results.to_string(index=False))
+        print(f'Saved baseline to {args.baseline}.')
+        return 0
+
+    comparison = compare_to_baseline(results, args.baseline, args.threshold)
+    print(comparison.to_string(index=False))
+
+    # A non-zero exit status lets CI fail on regressions
+    regressed = comparison[comparison['regressed']]
+    for row in regressed.itertuples():
+        print(f'SLOWER: {row.benchmark} at {row.scale}x ({row.time_ratio:.2f}x time, '
+              f'{row.memory_ratio:.2f}x memory)')
+    return 1 if len(regressed) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
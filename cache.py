@@ -0,0 +1,246 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+import joblib
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def data_fingerprint(*data):
+    """
+    Hash one or more DataFrames, Series or arrays into a short hex digest.
+
+    Parameters:
+        *data: The frames or arrays to fingerprint (None entries are allowed and hashed as such).
+
+    Returns:
+        str: A SHA-256 hex digest that changes whenever any value, column name or row order changes.
+    """
+    digest = hashlib.sha256()
+    for item in data:
+        if item is None:
+            digest.update(b'none')
+        elif isinstance(item, (pd.DataFrame, pd.Series)):
+            # Hash values and index row by row, plus the column names and dtypes
+            digest.update(pd.util.hash_pandas_object(item, index=True).to_numpy().tobytes())
+            columns = item.columns if isinstance(item, pd.DataFrame) else [item.name]
+            dtypes = item.dtypes if isinstance(item, pd.DataFrame) else [item.dtype]
+            digest.update(repr(list(zip(columns, map(str, dtypes)))).encode())
+        else:
+            arr = np.ascontiguousarray(item)
+            digest.update(repr((arr.shape, arr.dtype.str)).encode())
+            digest.update(arr.tobytes())
+    return digest.hexdigest()
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+class TrialCache:
+    """
+    Size-bounded on-disk cache of fitted models and their metrics.
+
+    Parameters:
+        directory (str): Where the cache files live (default is '.trial_cache').
+        max_bytes (int): Evict least recently used entries beyond this total size (default is 2 GB).
+
+    Note:
+        - Keys combine the data fingerprint, estimator class and all of its parameters (including
+          random_state), so any change to the data, configuration or seed is a miss.
+        - Recency is tracked through file modification times, which are bumped on every hit.
+    """
+
+    def __init__(self, directory='.trial_cache', max_bytes=2 * 1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(model, *data):
+        """
+        Build the cache key for an (unfitted) estimator and the data it will see.
+
+        Parameters:
+            model: An estimator instance; its class and `get_params()` are part of the key.
+            *data: Training and validation frames (and weights) passed to `data_fingerprint`.
+
+        Returns:
+            str: The cache key.
+        """
+        model_class = type(model)
+        params = sorted((name, repr(value)) for name, value in model.get_params().items())
+        config = f'{model_class.__module__}.{model_class.__qualname__}:{params}'
+        return hashlib.sha256((config + data_fingerprint(*data)).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.joblib')
+
+    def get(self, key):
+        """
+        Return the cached entry for a key, or None on a miss.
+        """
+        path = self._path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+
+        # Mark the entry as recently used
+        os.utime(path)
+        self.hits += 1
+        return joblib.load(path)
+
+    def put(self, key, entry):
+        """
+        Store an entry (e.g. {'model': ..., 'train_rmse': ..., 'val_rmse': ...}) and evict old entries.
+        """
+        # Write to a temporary file first so readers never see a partial entry
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        joblib.dump(entry, tmp_path)
+        os.replace(tmp_path, path)
+
+        self.evict()
+
+    def evict(self):
+        """
+        Delete least recently used entries until the cache fits in max_bytes.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.joblib'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+    def clear(self):
+        """
+        Delete every cached entry.
+        """
+        for name in os.listdir(self.directory):
+            if name.endswith('.joblib'):
+                os.remove(os.path.join(self.directory, name))
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+class PredictionCache:
+    """
+    Size-bounded LRU cache of predictions in front of a model's `predict`.
+
+    Parameters:
+        model: A fitted model (anything with `predict`).
+        max_entries (int): Evict least recently used rows beyond this many (default is 100,000).
+        decimals (int): Feature values are rounded to this many decimals before hashing, so
+            re-measured formulations that differ only by float noise share an entry (default is 6).
+
+    Note:
+        - Keys are 64-bit hashes of the rounded rows, computed for a whole batch at once. Frame
+          columns are put in the model's training order when it has one; array columns are
+          taken by position.
+        - A batch is split into hits and misses; only the distinct missing rows are predicted.
+
+    Example:
+        cached = PredictionCache(rforest)
+        cached.predict(X_test)
+        cached.stats()
+    """
+
+    def __init__(self, model, max_entries=100_000, decimals=6):
+        self.model = model
+        self.max_entries = max_entries
+        self.decimals = decimals
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _ordered(self, X):
+        # Frames are put in the training column order of scikit-learn models and FlatForests;
+        # arrays are taken to be in that order already
+        names = getattr(self.model, 'feature_names_in_', getattr(self.model, 'feature_names', None))
+        if hasattr(X, 'columns') and names is not None:
+            return X[list(names)]
+        return X
+
+    def keys(self, X):
+        """
+        Canonical hash of every row of X.
+        """
+        X = self._ordered(X)
+
+        # Round, and turn -0.0 into 0.0 so equal values always hash alike
+        values = np.round(np.asarray(X, dtype=float), self.decimals) + 0.0
+        return pd.util.hash_pandas_object(pd.DataFrame(values), index=False).to_numpy()
+
+    def predict(self, X):
+        """
+        Predict a batch, answering repeated rows from the cache.
+
+        Parameters:
+            X (pd.DataFrame or np.array): Rows with the model's features.
+
+        Returns:
+            np.array: The predictions, in row order.
+        """
+        X = self._ordered(X)
+        keys = self.keys(X)
+        predictions = np.empty(len(keys))
+
+        # Look up every row, marking the cached ones as recently used
+        missing = np.zeros(len(keys), dtype=bool)
+        for i, key in enumerate(keys):
+            value = self.entries.get(key)
+            if value is None:
+                missing[i] = True
+            else:
+                self.entries.move_to_end(key)
+                predictions[i] = value
+
+        n_missing = int(missing.sum())
+        self.hits += len(keys) - n_missing
+        self.misses += n_missing
+
+        if n_missing:
+            # Predict each distinct missing row once
+            miss_keys, first, inverse = np.unique(keys[missing], return_index=True, return_inverse=True)
+            rows = np.flatnonzero(missing)[first]
+            X_miss = X.iloc[rows] if hasattr(X, 'iloc') else np.asarray(X)[rows]
+            miss_predictions = np.asarray(self.model.predict(X_miss), dtype=float)
+            predictions[missing] = miss_predictions[inverse.ravel()]
+
+            self.entries.update(zip(miss_keys, miss_predictions))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+        return predictions
+
+    def stats(self):
+        """
+        Hit and miss counts, hit rate, evictions and current size.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else None,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+        }
+
+    def clear(self):
+        """
+        Drop every cached prediction and reset the counters.
+        """
+        self.entries.clear()
+        self.hits = self.misses = self.evictions = 0
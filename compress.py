@@ -0,0 +1,174 @@
+import pickle
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from sklearn.ensemble import HistGradientBoostingRegressor
+
+from flat_forest import FlatForest, compile_forest
+from model import eval_model
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def single_row_latency(predictor, X, repeats=20):
+    """
+    Best-of-n time in milliseconds to predict one row.
+    """
+    row = X.iloc[:1] if hasattr(X, 'iloc') else X[:1]
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predictor.predict(row)
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def _step(name, flat, X_val, y_val):
+    # One report row for a compiled forest
+    return {
+        'Step': name,
+        'Trees': flat.n_trees,
+        'Nodes': flat.n_nodes,
+        'Size_MB': flat.nbytes / 1024 ** 2,
+        'Latency_ms': single_row_latency(flat, X_val),
+        'Val_RMSE': eval_model(y_val, flat.predict(X_val))
+    }
+
+
+def greedy_tree_order(flat, X_val, y_val, max_trees=None):
+    """
+    Order trees by greedy forward selection on validation RMSE.
+
+    Parameters:
+        flat (FlatForest): The compiled forest.
+        X_val (pd.DataFrame): Validation features.
+        y_val (pd.Series): Validation target.
+        max_trees (int, optional): Stop after this many trees. Default is None (order every tree).
+
+    Returns:
+        order (list): Tree positions in the order they were selected.
+        rmse (np.array): Validation RMSE of the first 1, 2, ... selected trees.
+
+    Note:
+        - Each tree's validation predictions are computed once; every step then scores all
+          remaining trees at once from the running sum of the trees already chosen.
+    """
+    X = X_val[flat.feature_names] if flat.feature_names is not None else X_val
+    tree_preds = flat._tree_values(np.asarray(X, dtype=np.float32)).T
+    y = np.asarray(y_val, dtype=float)
+
+    n_trees = flat.n_trees if max_trees is None else min(max_trees, flat.n_trees)
+    remaining = np.ones(flat.n_trees, dtype=bool)
+    running_sum = np.zeros(len(y))
+    order, rmse = [], []
+
+    for k in range(1, n_trees + 1):
+        # RMSE of the ensemble with each candidate tree added
+        candidate_rmse = np.sqrt((((running_sum + tree_preds) / k - y) ** 2).mean(axis=1))
+        candidate_rmse[~remaining] = np.inf
+        best = int(np.argmin(candidate_rmse))
+
+        order.append(best)
+        rmse.append(candidate_rmse[best])
+        remaining[best] = False
+        running_sum += tree_preds[best]
+
+    return order, np.array(rmse)
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def compress_forest(model, X_val, y_val, max_depth=None, max_trees=None, target_mb=None,
+                    target_latency_ms=None, distill_X=None):
+    """
+    Shrink a fitted forest to meet size or latency budgets and report the RMSE cost of each step.
+
+    Parameters:
+        model: A fitted forest from `train_model` / `train_hyper`, or an already compiled FlatForest.
+        X_val (pd.DataFrame): Validation features used to choose trees and measure RMSE.
+        y_val (pd.Series): Validation target.
+        max_depth (int, optional): Cap every tree at this depth first. Default is None.
+        max_trees (int, optional): Keep at most this many trees. Default is None.
+        target_mb (float, optional): Keep the compiled arrays under this size. Default is None.
+        target_latency_ms (float, optional): Keep single-row latency under this. Default is None.
+        distill_X (pd.DataFrame, optional): Unlabelled rows (e.g. X_train) to distil the compressed
+            forest into a HistGradientBoostingRegressor student. Default is None (no distillation).
+
+    Returns:
+        flat (FlatForest): The compressed forest.
+        report (pd.DataFrame): Trees, nodes, size, single-row latency and Val_RMSE after each step.
+        student: The distilled model, only when `distill_X` is given.
+
+    Note:
+        - Trees are chosen by greedy forward selection on validation RMSE. Without budgets the
+          prefix with the lowest validation RMSE is kept; with budgets, the largest prefix that fits.
+        - Choosing trees on the validation set makes its RMSE optimistic; confirm on the test set.
+        - At least one tree is always kept. If even one tree is over a budget, a warning gives the
+          achieved size or latency, which is also in the report.
+    """
+    flat = model if isinstance(model, FlatForest) else compile_forest(model)
+    steps = [_step('original', flat, X_val, y_val)]
+
+    # Depth cap
+    if max_depth is not None:
+        flat = flat.cap_depth(max_depth)
+        steps.append(_step(f'depth <= {max_depth}', flat, X_val, y_val))
+
+    # Greedy tree selection
+    order, rmse = greedy_tree_order(flat, X_val, y_val, max_trees)
+    if target_mb is None and target_latency_ms is None:
+        n_keep = int(np.argmin(rmse)) + 1
+    else:
+        # Largest prefix under the size budget (tree sizes add up exactly)
+        bytes_per_node = flat.nbytes / flat.n_nodes
+        tree_nodes = np.diff(np.append(np.asarray(flat.roots), flat.n_nodes))[order]
+        sizes = np.cumsum(tree_nodes) * bytes_per_node / 1024 ** 2
+        n_keep = len(order) if target_mb is None else max(int(np.searchsorted(sizes, target_mb, side='right')), 1)
+
+        # Binary-search the largest prefix whose single-row latency fits (latency grows with the trees)
+        def fits(n_trees):
+            return single_row_latency(flat.subset(order[:n_trees]), X_val) <= target_latency_ms
+
+        if target_latency_ms is not None and not fits(n_keep):
+            low, high = 1, n_keep - 1
+            while low < high:
+                middle = (low + high + 1) // 2
+                if fits(middle):
+                    low = middle
+                else:
+                    high = middle - 1
+            n_keep = low
+
+    flat = flat.subset(order[:n_keep])
+    steps.append(_step(f'greedy {n_keep} trees', flat, X_val, y_val))
+
+    # A single tree can still be over budget; say so rather than return it silently
+    achieved = steps[-1]
+    if n_keep == 1 and target_mb is not None and achieved['Size_MB'] > target_mb:
+        warnings.warn(f"Size budget of {target_mb} MB cannot be met: one tree is {achieved['Size_MB']:.3f} MB.")
+    if n_keep == 1 and target_latency_ms is not None and achieved['Latency_ms'] > target_latency_ms:
+        warnings.warn(f"Latency budget of {target_latency_ms} ms cannot be met: one tree takes "
+                      f"{achieved['Latency_ms']:.3f} ms per row.")
+
+    report = pd.DataFrame(steps)
+
+    if distill_X is None:
+        return flat, report
+
+    # Distil into a boosted student trained on the compressed forest's predictions
+    student = HistGradientBoostingRegressor(max_iter=300, early_stopping=True, random_state=42)
+    student.fit(distill_X, flat.predict(distill_X))
+    student_row = {
+        'Step': 'distilled',
+        'Trees': student.n_iter_,
+        'Nodes': np.nan,
+        'Size_MB': len(pickle.dumps(student)) / 1024 ** 2,
+        'Latency_ms': single_row_latency(student, X_val),
+        'Val_RMSE': eval_model(y_val, student.predict(X_val))
+    }
+    report = pd.concat([report, pd.DataFrame([student_row])], ignore_index=True)
+
+    return flat, report, student
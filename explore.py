@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 from scipy import stats
@@ -9,12 +10,150 @@ from sklearn.preprocessing import MinMaxScaler
 from sklearn.cluster import KMeans
 
 
-from wrangle import wine_train_val_test, acquire_wine
+from wrangle import wine_train_val_test, acquire_wine, compact_wine
+from instrument import stage
+
+# Quality tiers used throughout exploration: Low = 4-5, Med = 6, High = 7-9
+QUALITY_BINS = [3, 5, 6, 9]
+QUALITY_LABELS = ['Low', 'Med', 'High']
+
+# Global sampling option for the exploration and visualization entry points (see `set_sampling`)
+SAMPLING = {'size': None, 'method': 'stratified', 'seed': 42}
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def set_sampling(size=None, method='stratified', seed=42):
+    """
+    Turn sample-based exploration on or off for every exploration and visualization entry point.
+
+    Parameters:
+        size (int, optional): Target number of rows. Default is None, which uses the full frame.
+        method (str): 'stratified' (proportional by quality) or 'reservoir' (uniform) (default is 'stratified').
+        seed (int): Random seed, so the same frame always gives the same sample (default is 42).
+
+    Example:
+        set_sampling(50_000)       # explore on a 50k-row sample
+        set_sampling(None)         # back to the full data
+    """
+    SAMPLING.update(size=size, method=method, seed=seed)
+
+
+def reservoir_sample(data, size, seed=42):
+    """
+    Draw a uniform random sample of rows from a DataFrame or a stream of DataFrame chunks.
+
+    Parameters:
+        data (pd.DataFrame or iterable): The rows to sample, e.g. `acquire_wine_chunks()`.
+        size (int): Number of rows to keep.
+        seed (int): Random seed (default is 42).
+
+    Returns:
+        pd.DataFrame: The sample, with attrs['sample_fraction'] set.
+
+    Note:
+        - Every row gets a uniform random key and the rows with the smallest keys are kept,
+          which is a reservoir sample that can be maintained one chunk at a time.
+    """
+    rng = np.random.default_rng(seed)
+    chunks = [data] if isinstance(data, pd.DataFrame) else data
+
+    reservoir, keys, seen = None, np.empty(0), 0
+    for chunk in chunks:
+        seen += len(chunk)
+
+        # Merge this chunk's keys with the current reservoir and keep the smallest
+        chunk_keys = rng.random(len(chunk))
+        candidates = chunk if reservoir is None else pd.concat([reservoir, chunk])
+        all_keys = np.concatenate([keys, chunk_keys])
+        if len(all_keys) > size:
+            keep = np.sort(np.argpartition(all_keys, size)[:size])
+        else:
+            keep = np.arange(len(all_keys))
+        reservoir, keys = candidates.iloc[keep], all_keys[keep]
+
+    sample = reservoir.copy()
+    sample.attrs['sample_fraction'] = len(sample) / seen if seen else 1.0
+    return sample
+
+
+def stratified_sample(df, size, by='quality', seed=42):
+    """
+    Draw a sample that keeps each group's share of the rows, e.g. each quality score.
+
+    Parameters:
+        df (pd.DataFrame): The rows to sample.
+        size (int): Target number of rows.
+        by (str): The column to stratify on (default is 'quality').
+        seed (int): Random seed (default is 42).
+
+    Returns:
+        pd.DataFrame: The sample in original row order, with attrs['sample_fraction'] set.
+
+    Note:
+        - Every non-empty group keeps at least one row, so rare scores (3 and 9) stay visible.
+    """
+    rng = np.random.default_rng(seed)
+    codes, uniques = pd.factorize(df[by])
+
+    # Proportional allocation per group
+    group_sizes = np.bincount(codes, minlength=len(uniques))
+    allocation = np.maximum(np.round(group_sizes * size / len(df)), 1).astype(int)
+
+    # Rank rows within their group by a random key and keep the first `allocation` of each
+    order = np.lexsort((rng.random(len(df)), codes))
+    group_starts = np.concatenate([[0], np.cumsum(group_sizes)[:-1]])
+    rank_in_group = np.arange(len(df)) - group_starts[codes[order]]
+    keep = np.sort(order[rank_in_group < allocation[codes[order]]])
+
+    sample = df.iloc[keep].copy()
+    sample.attrs['sample_fraction'] = len(sample) / len(df)
+    return sample
+
+
+def sample_frame(df):
+    """
+    Apply the global sampling option from `set_sampling` to a frame.
+
+    Parameters:
+        df (pd.DataFrame): The full frame.
+
+    Returns:
+        pd.DataFrame: The frame itself when sampling is off or it is already small enough,
+            otherwise a new sample with attrs['sample_fraction'] set.
+
+    Note:
+        - Samples are seeded, so repeated calls on the same rows pick the same rows.
+        - When sampling is off the caller's frame is returned without a copy, so treat the
+          result as read-only; copy it before adding columns.
+    """
+    size = SAMPLING['size']
+    if size is None or len(df) <= size:
+        return df
+
+    if SAMPLING['method'] == 'reservoir':
+        return reservoir_sample(df, size, seed=SAMPLING['seed'])
+    return stratified_sample(df, size, seed=SAMPLING['seed'])
+
+
+def sample_note(df):
+    """
+    Describe the sample a frame came from, or return an empty string for full data.
+    """
+    fraction = df.attrs.get('sample_fraction', 1.0)
+    if fraction >= 1:
+        return ''
+    return f'sample of {len(df):,} rows ({fraction:.2%} of the data)'
 
 # -----------------------------------------------------------------------------------------------
 # -----------------------------------------------------------------------------------------------
 
 def spearmanr_test(df,col_name):
+    # Use the global exploration sample, if one is configured
+    df = sample_frame(df)
+    if sample_note(df):
+        print(f'Using a {sample_note(df)}.')
+
     # Perform spearmanr test
     spearman_corr, p_value = stats.spearmanr(df['quality'], df[col_name])
 
@@ -41,6 +180,11 @@ def perform_chi2_test(df, variable1, variable2):
     Returns:
     - None (results are printed).
     """
+    # Use the global exploration sample, if one is configured
+    df = sample_frame(df)
+    if sample_note(df):
+        print(f'Using a {sample_note(df)}.')
+
     # Create a contingency table
     df = cluster_alc_dens(df)
         
@@ -69,6 +213,103 @@ def perform_chi2_test(df, variable1, variable2):
 # -----------------------------------------------------------------------------------------------
 # -----------------------------------------------------------------------------------------------
 
+def quality_tier_codes(quality):
+    """
+    Map quality scores to integer tier codes without building a categorical column.
+
+    Parameters:
+        quality (pd.Series or np.array): Quality scores.
+
+    Returns:
+        np.array: 0 (Low), 1 (Med) or 2 (High), and -1 for scores outside QUALITY_BINS.
+
+    Note:
+        - Matches pd.cut(quality, bins=QUALITY_BINS): intervals are closed on the right,
+          so a quality of 3 falls outside every tier just as it does with pd.cut.
+    """
+    codes = np.searchsorted(QUALITY_BINS, np.asarray(quality), side='left') - 1
+    return np.where((codes >= 0) & (codes < len(QUALITY_LABELS)), codes, -1)
+
+
+def _group_codes(df, key):
+    # Integer codes and labels for one grouping key
+    if key == 'quality_tier':
+        return quality_tier_codes(df['quality']), pd.Index(QUALITY_LABELS, name=key)
+    codes, uniques = pd.factorize(df[key], sort=True)
+    return codes, pd.Index(uniques, name=key)
+
+def grouped_stats(df, by='quality_tier', z=1.96):
+    """
+    Compute the mean, count and confidence interval of every numeric feature per group in one pass.
+
+    Parameters:
+        df (pd.DataFrame): The wine data.
+        by (str or list): 'quality_tier', any column such as 'type' or 'quality', or a list of them
+            (default is 'quality_tier').
+        z (float): Critical value for the confidence interval (default is 1.96 for 95%).
+
+    Returns:
+        pd.DataFrame: One row per group, with (feature, stat) columns where stat is one of
+            'mean', 'count', 'ci_low' and 'ci_high'.
+
+    Note:
+        - Nothing is cached; compute once and pass the result to the plots' `stats` argument
+          to share it.
+
+    Example:
+        tier_stats = grouped_stats(train)
+        tier_stats['alcohol']['mean']
+        alcohol_vs_quanity(train, stats=tier_stats)
+    """
+    keys = [by] if isinstance(by, str) else list(by)
+
+    # Combine the integer codes of every key into a single group code
+    codes = np.zeros(len(df), dtype=np.int64)
+    valid = np.ones(len(df), dtype=bool)
+    levels = []
+    for key in keys:
+        key_codes, labels = _group_codes(df, key)
+        valid &= key_codes >= 0
+        codes = codes * len(labels) + key_codes
+        levels.append(labels)
+    n_groups = int(np.prod([len(labels) for labels in levels]))
+
+    # Per-group counts, sums and sums of squares of every numeric feature, one bincount each
+    # (missing values contribute nothing)
+    features = [col for col in df.select_dtypes(include=['number']).columns if col not in keys]
+    group_codes = codes[valid]
+    counts, sums, sums_sq = (np.empty((n_groups, len(features))) for _ in range(3))
+    for j, feature in enumerate(features):
+        x = df[feature].to_numpy(dtype=float)[valid]
+        present = ~np.isnan(x)
+        x = np.where(present, x, 0.0)
+        counts[:, j] = np.bincount(group_codes, weights=present, minlength=n_groups)
+        sums[:, j] = np.bincount(group_codes, weights=x, minlength=n_groups)
+        sums_sq[:, j] = np.bincount(group_codes, weights=x * x, minlength=n_groups)
+
+    # Means, sample standard deviations and normal-approximation intervals
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = sums / counts
+        variances = (sums_sq - counts * means ** 2) / (counts - 1)
+        half_width = z * np.sqrt(np.maximum(variances, 0) / counts)
+
+    if len(levels) == 1:
+        index = levels[0]
+    else:
+        index = pd.MultiIndex.from_product(levels)
+
+    # Interleave the statistics under each feature
+    columns = {}
+    for j, feature in enumerate(features):
+        columns[(feature, 'mean')] = means[:, j]
+        columns[(feature, 'count')] = counts[:, j].astype(int)
+        columns[(feature, 'ci_low')] = means[:, j] - half_width[:, j]
+        columns[(feature, 'ci_high')] = means[:, j] + half_width[:, j]
+    return pd.DataFrame(columns, index=index)
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
 def kbest_features(df, col_name, k=2):
     """
     Selects the top k best features for regression from a DataFrame.
@@ -229,12 +470,19 @@ def feature_selections_results(df, col_name, k=2):
 
     Returns:
     DataFrame: A DataFrame containing the selected features from three different feature selection methods.
+        When sampling is on, attrs['sample_fraction'] records the share of rows used.
     """
+    # Run all three selectors on the same global exploration sample, if one is configured
+    df = sample_frame(df)
+    if sample_note(df):
+        print(f'Using a {sample_note(df)}.')
+
     selected_df1 = kbest_features(df, col_name, k)
     selected_df2 = rfe_features(df, col_name, k)
     selected_df3 = lasso_features(df, col_name, k)
     
     final_selected_df = pd.concat([selected_df1, selected_df2, selected_df3], axis=1)
+    final_selected_df.attrs['sample_fraction'] = df.attrs.get('sample_fraction', 1.0)
     
     return final_selected_df
 
@@ -344,18 +592,54 @@ def xy_split(df):
 # -----------------------------------------------------------------------------------------------
 # -----------------------------------------------------------------------------------------------
 
-def data_pipeline():
-    df = acquire_wine()
+def xyw_split(df, count_col='n_copies'):
+    """
+    Split a compacted DataFrame into feature matrix (X), target vector (y) and sample weights (w).
 
-    df = df[df.density <= 1.01]
-    df = df[df.alcohol <= 14.04]
+    Parameters:
+    df (DataFrame): A DataFrame produced from `compact_wine`.
+    count_col (str): The column holding the duplicate counts (default is 'n_copies').
+
+    Returns:
+    X (DataFrame): Feature matrix (all columns except 'quality' and the count column).
+    y (Series): Target vector (column 'quality').
+    w (Series): Sample weights (the count column).
+    """
+    return df.drop(columns=['quality', count_col]), df.quality, df[count_col]
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def data_pipeline(compact=False, df=None):
+    # Read the CSVs unless a frame (e.g. an upscaled copy for benchmarking) is passed in
+    with stage('acquire'):
+        if df is None:
+            df = acquire_wine()
+
+    with stage('filter'):
+        df = df[df.density <= 1.01]
+        df = df[df.alcohol <= 14.04]
+
+    # Collapse duplicate rows before splitting so copies never straddle train and test
+    if compact:
+        with stage('compact'):
+            df = compact_wine(df)
     
-    train, val, test = wine_train_val_test(df)
+    with stage('split'):
+        train, val, test = wine_train_val_test(df)
     
     #train, val, test = scale_train_val_test(train, val, test)
-    train = hot_encode(train)
-    val = hot_encode(val)
-    test = hot_encode(test)
+    with stage('encode'):
+        train = hot_encode(train)
+        val = hot_encode(val)
+        test = hot_encode(test)
+
+    # Return the duplicate counts alongside each split for use as sample weights
+    if compact:
+        X_train, y_train, w_train = xyw_split(train)
+        X_val, y_val, w_val = xyw_split(val)
+        X_test, y_test, w_test = xyw_split(test)
+        return X_train, y_train, w_train, X_val, y_val, w_val, X_test, y_test, w_test
     
     X_train, y_train = xy_split(train)
     X_val, y_val = xy_split(val)
@@ -366,6 +650,35 @@ def data_pipeline():
 # -----------------------------------------------------------------------------------------------
 # -----------------------------------------------------------------------------------------------
 
+def hist_pipeline():
+    """
+    Prepare the data for histogram gradient boosting, keeping 'type' as one categorical column.
+
+    Returns:
+        X_train, y_train, X_val, y_val, X_test, y_test: Same splits as `data_pipeline`, but with
+            'type' encoded as integer category codes (0 = red, 1 = white) instead of dummies.
+
+    Note:
+        - Pass `categorical_features` to the model so 'type' is split on as a category (see `model.train_hist`).
+    """
+    df = acquire_wine()
+
+    df = df[df.density <= 1.01]
+    df = df[df.alcohol <= 14.04]
+
+    # Integer category codes with fixed levels, so every split encodes 'type' the same way
+    df['type'] = pd.Categorical(df['type'], categories=['red', 'white']).codes
+
+    train, val, test = wine_train_val_test(df)
+
+    X_train, y_train = xy_split(train)
+    X_val, y_val = xy_split(val)
+    X_test, y_test = xy_split(test)
+    return X_train, y_train, X_val, y_val, X_test, y_test
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
 def data_pipeline_features():
     df = acquire_wine()
     df = new_feats(df)
@@ -389,32 +702,56 @@ def data_pipeline_features():
 # -----------------------------------------------------------------------------------------------
 # -----------------------------------------------------------------------------------------------
 
-def bravo_pipeline():
-    df = acquire_wine()
+def bravo_pipeline(compact=False, df=None):
+    # Read the CSVs unless a frame (e.g. an upscaled copy for benchmarking) is passed in
+    with stage('acquire'):
+        if df is None:
+            df = acquire_wine()
 
-    df = df[df.density <= 1.01]
-    df = df[df.alcohol <= 14.04]
+    with stage('filter'):
+        df = df[df.density <= 1.01]
+        df = df[df.alcohol <= 14.04]
+
+    # Collapse duplicate rows before splitting so copies never straddle train and test
+    weights = None
+    if compact:
+        with stage('compact'):
+            df = compact_wine(df)
+        weights = df['n_copies']
     
     mms = MinMaxScaler()
     # Select columns to scale (excluding 'value')
     to_scale = df.select_dtypes(include=['float', 'int']).columns.tolist()
     to_scale.remove('quality')
+    if compact:
+        to_scale.remove('n_copies')
     
     
-    df[to_scale] = mms.fit_transform(df[to_scale])
+    with stage('scale'):
+        df[to_scale] = mms.fit_transform(df[to_scale])
 
-    kmeans = KMeans(n_clusters=3, n_init='auto')
-    features = df[['alcohol', 'density']]
-    kmeans.fit(features)
+    with stage('kmeans'):
+        kmeans = KMeans(n_clusters=3, n_init='auto')
+        features = df[['alcohol', 'density']]
+        kmeans.fit(features, sample_weight=weights)
 
     df['alc_dens_cluster'] = kmeans.labels_
 
-    train, val, test = wine_train_val_test(df)
+    with stage('split'):
+        train, val, test = wine_train_val_test(df)
     
     #train, val, test = scale_train_val_test(train, val, test)
-    train = hot_encode(train)
-    val = hot_encode(val)
-    test = hot_encode(test)
+    with stage('encode'):
+        train = hot_encode(train)
+        val = hot_encode(val)
+        test = hot_encode(test)
+
+    # Return the duplicate counts alongside each split for use as sample weights
+    if compact:
+        X_train, y_train, w_train = xyw_split(train)
+        X_val, y_val, w_val = xyw_split(val)
+        X_test, y_test, w_test = xyw_split(test)
+        return X_train, y_train, w_train, X_val, y_val, w_val, X_test, y_test, w_test
     
     X_train, y_train = xy_split(train)
     X_val, y_val = xy_split(val)
@@ -424,6 +761,155 @@ def bravo_pipeline():
 # -----------------------------------------------------------------------------------------------
 # -----------------------------------------------------------------------------------------------
 
+# Rows outside these bounds are treated as outliers throughout the project
+OUTLIER_RULES = {'density': 1.01, 'alcohol': 14.04}
+
+
+class WinePrep:
+    """
+    The preprocessing of `data_pipeline` / `bravo_pipeline` as a fitted object that can score new rows.
+
+    Parameters:
+        new_features (bool): Add the `new_feats` columns (default is False).
+        scale (bool): Min-max scale the measurements, as in `bravo_pipeline` (default is False).
+        cluster (bool): Add the KMeans 'alc_dens_cluster' label on scaled alcohol and density,
+            as in `bravo_pipeline`; requires `scale` (default is False).
+
+    Note:
+        - `fit` learns the scaling bounds, cluster centroids and output columns from training rows
+          (after the outlier rules); `transform` then works on any number of raw rows, including one.
+        - 'type' is encoded as 'type_white' like `hot_encode`, even when a batch holds only one type.
+
+    Example:
+        prep = WinePrep(scale=True, cluster=True).fit(train)
+        X_train = prep.transform(train)
+    """
+
+    def __init__(self, new_features=False, scale=False, cluster=False):
+        self.new_features = new_features
+        self.scale = scale
+        self.cluster = cluster
+        self.categories = ['red', 'white']
+
+    def valid(self, df):
+        """
+        Boolean mask of the rows that pass the outlier rules.
+        """
+        mask = np.ones(len(df), dtype=bool)
+        for col, upper in OUTLIER_RULES.items():
+            mask &= (df[col] <= upper).to_numpy()
+        return mask
+
+    def _features(self, df):
+        # Engineered features on a copy, so callers' frames are untouched
+        df = df.drop(columns=['quality'], errors='ignore').copy()
+        if self.new_features:
+            df = new_feats(df)
+        return df
+
+    def fit(self, df):
+        """
+        Learn the scaling bounds, cluster centroids and output columns.
+
+        Parameters:
+            df (pd.DataFrame): Raw training rows shaped like `acquire_wine` output.
+
+        Returns:
+            WinePrep: The fitted preprocessor.
+        """
+        # Raw columns every row must carry to be scored
+        self.input_columns = [col for col in df.columns if col != 'quality']
+
+        df = self._features(df[self.valid(df)])
+
+        # Numeric measurements only; 'type' is encoded separately
+        self.numeric_columns = df.select_dtypes(include='number').columns.tolist()
+
+        if self.scale:
+            mms = MinMaxScaler().fit(df[self.numeric_columns])
+            self.scale_min, self.scale_range = mms.data_min_, mms.data_range_
+            df[self.numeric_columns] = mms.transform(df[self.numeric_columns])
+
+        if self.cluster:
+            kmeans = KMeans(n_clusters=3, n_init='auto', random_state=42).fit(df[['alcohol', 'density']])
+            self.centroids = kmeans.cluster_centers_
+
+        self.columns = self.numeric_columns + (['alc_dens_cluster'] if self.cluster else []) + ['type_white']
+        return self
+
+    def transform(self, df):
+        """
+        Turn raw rows into the model's feature matrix.
+
+        Parameters:
+            df (pd.DataFrame): Raw rows shaped like `acquire_wine` output ('quality' is optional).
+
+        Returns:
+            pd.DataFrame: Features in the fitted column order. Outliers are transformed too;
+                check them with `valid`.
+        """
+        df = self._features(df)
+
+        if self.scale:
+            df[self.numeric_columns] = (df[self.numeric_columns].to_numpy() - self.scale_min) / self.scale_range
+
+        if self.cluster:
+            # Nearest centroid, as KMeans.predict would give
+            points = df[['alcohol', 'density']].to_numpy()
+            distances = ((points[:, None, :] - self.centroids[None, :, :]) ** 2).sum(axis=2)
+            df['alc_dens_cluster'] = distances.argmin(axis=1).astype(np.int32)
+
+        df['type_white'] = (df['type'] == 'white').to_numpy()
+        return df[self.columns]
+
+    def fit_transform(self, df):
+        """
+        Fit on `df` and return its transformed rows (after the outlier rules).
+        """
+        return self.fit(df).transform(df[self.valid(df)])
+
+    def to_dict(self):
+        """
+        The fitted state as plain JSON-serialisable values (columns, scaler bounds, centroids,
+        category levels and outlier rules).
+        """
+        state = {
+            'new_features': self.new_features,
+            'scale': self.scale,
+            'cluster': self.cluster,
+            'categories': self.categories,
+            'outlier_rules': OUTLIER_RULES,
+            'input_columns': self.input_columns,
+            'numeric_columns': self.numeric_columns,
+            'columns': self.columns,
+        }
+        if self.scale:
+            state['scale_min'] = self.scale_min.tolist()
+            state['scale_range'] = self.scale_range.tolist()
+        if self.cluster:
+            state['centroids'] = self.centroids.tolist()
+        return state
+
+    @staticmethod
+    def from_dict(state):
+        """
+        Rebuild a fitted WinePrep from `to_dict` output.
+        """
+        prep = WinePrep(state['new_features'], state['scale'], state['cluster'])
+        prep.categories = state['categories']
+        prep.input_columns = state['input_columns']
+        prep.numeric_columns = state['numeric_columns']
+        prep.columns = state['columns']
+        if prep.scale:
+            prep.scale_min = np.array(state['scale_min'])
+            prep.scale_range = np.array(state['scale_range'])
+        if prep.cluster:
+            prep.centroids = np.array(state['centroids'])
+        return prep
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
 
 def outliers(df):
     df = df[df.density <= 1.01]
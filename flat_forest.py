@@ -0,0 +1,343 @@
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+# The packed arrays that make up a compiled forest
+ARRAYS = ['feature', 'threshold', 'left', 'right', 'value', 'roots']
+
+# Derived arrays the predictor walks, saved alongside so loading processes can share them
+TRAVERSAL_ARRAYS = ['_children', '_is_leaf']
+
+
+class FlatForest:
+    """
+    A tree ensemble compiled into packed NumPy arrays, with a vectorized batch predictor.
+
+    Parameters:
+        feature (np.array): Split feature of every node (0 for leaves).
+        threshold (np.array): Split threshold of every node; rows go left when x <= threshold.
+        left (np.array): Global index of every node's left child (leaves point to themselves).
+        right (np.array): Global index of every node's right child (leaves point to themselves).
+        value (np.array): Mean target value of every node.
+        roots (np.array): Global index of each tree's root node.
+        feature_names (list, optional): Column names the forest was trained on. Default is None.
+
+    Note:
+        - Every tree is stored back to back in the same arrays, so a prediction is a handful of
+          array gathers per tree level over all (row, tree) pairs at once.
+        - Only NumPy is needed to predict, so scoring processes do not have to import scikit-learn.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, feature_names=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.feature_names = feature_names
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        # Total size of the packed arrays
+        return sum(getattr(self, name).nbytes for name in ARRAYS)
+
+    def _traversal_arrays(self):
+        """
+        Interleaved children and leaf flags, built on first use and kept in memory (or
+        memory-mapped by `load`).
+        """
+        if getattr(self, '_children', None) is None:
+            # One gather picks the branch: [2 * node] is the left child, [2 * node + 1] the right
+            self._children = np.empty(2 * self.n_nodes, dtype=self.left.dtype)
+            self._children[0::2], self._children[1::2] = self.left, self.right
+            self._is_leaf = self.left == np.arange(self.n_nodes)
+        return self._children, self._is_leaf
+
+    def _tree_values(self, X):
+        """
+        Leaf value of every (row, tree) pair, shape (n_rows, n_trees).
+        """
+        n_rows, n_features = X.shape
+        X_flat = X.ravel()
+
+        children, is_leaf = self._traversal_arrays()
+
+        # Start every (row, tree) pair at its tree's root
+        leaves = np.empty(n_rows * self.n_trees, dtype=self.left.dtype)
+        active = np.arange(len(leaves))
+        current = np.tile(self.roots, n_rows)
+        row_offsets = np.repeat(np.arange(n_rows) * n_features, self.n_trees).astype(self.left.dtype)
+
+        while len(active):
+            # Send every active pair one level down (pairs already at a leaf stay put)
+            go_right = X_flat[row_offsets + self.feature[current]] > self.threshold[current]
+            current = children[2 * current + go_right]
+
+            # Retire finished pairs only once enough have piled up, since compacting costs a pass
+            done = is_leaf[current]
+            n_done = np.count_nonzero(done)
+            if n_done > len(active) // 4 or n_done == len(active):
+                leaves[active[done]] = current[done]
+                keep = ~done
+                active, current, row_offsets = active[keep], current[keep], row_offsets[keep]
+
+        return self.value[leaves].reshape(n_rows, self.n_trees)
+
+    def predict(self, X, batch_size=2048, n_jobs=1):
+        """
+        Predict the forest average for a batch of rows.
+
+        Parameters:
+            X (pd.DataFrame or np.array): Rows with the training columns, in training order.
+            batch_size (int): Rows traversed at a time, to bound memory (default is 2,048).
+            n_jobs (int): Threads to spread the batches over; NumPy releases the GIL
+                while gathering (default is 1).
+
+        Returns:
+            np.array: The predictions.
+
+        Note:
+            - Inputs are cast to float32 and tree outputs are summed in tree order before dividing,
+              exactly like scikit-learn, so predictions match its single-threaded output.
+        """
+        if self.feature_names is not None and hasattr(X, 'columns'):
+            X = X[self.feature_names]
+        X = np.asarray(X, dtype=np.float32)
+
+        predictions = np.empty(len(X))
+
+        def predict_batch(start):
+            tree_values = self._tree_values(X[start:start + batch_size])
+
+            # Accumulate tree by tree, then average
+            total = np.zeros(len(tree_values))
+            for tree in range(self.n_trees):
+                total += tree_values[:, tree]
+            predictions[start:start + batch_size] = total / self.n_trees
+
+        starts = range(0, len(X), batch_size)
+        if n_jobs > 1 and len(starts) > 1:
+            with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+                list(pool.map(predict_batch, starts))
+        else:
+            for start in starts:
+                predict_batch(start)
+
+        return predictions
+
+    def node_depths(self):
+        """
+        Depth of every node below its tree's root (roots are depth 0).
+        """
+        depths = np.zeros(self.n_nodes, dtype=np.int32)
+        frontier = np.asarray(self.roots)
+        depth = 0
+        while len(frontier):
+            depths[frontier] = depth
+            # Children of the internal nodes on this level form the next level
+            internal = frontier[self.left[frontier] != frontier]
+            frontier = np.concatenate([self.left[internal], self.right[internal]])
+            depth += 1
+        return depths
+
+    def _reachable(self, roots, left, right):
+        """
+        Build a compact forest from the nodes reachable from `roots` under the given children.
+        """
+        keep = np.zeros(self.n_nodes, dtype=bool)
+        frontier = np.asarray(roots)
+        while len(frontier):
+            keep[frontier] = True
+            internal = frontier[left[frontier] != frontier]
+            frontier = np.concatenate([left[internal], right[internal]])
+
+        # Renumber the kept nodes in their original order
+        new_ids = np.cumsum(keep) - 1
+        kept = np.flatnonzero(keep)
+        index_type = self.left.dtype
+
+        return FlatForest(
+            feature=np.asarray(self.feature)[kept],
+            threshold=np.asarray(self.threshold)[kept],
+            left=new_ids[left[kept]].astype(index_type),
+            right=new_ids[right[kept]].astype(index_type),
+            value=np.asarray(self.value)[kept],
+            roots=new_ids[roots].astype(index_type),
+            feature_names=self.feature_names
+        )
+
+    def subset(self, trees):
+        """
+        A new forest with only the given trees, in the given order.
+
+        Parameters:
+            trees (list): Tree positions to keep.
+
+        Returns:
+            FlatForest: The smaller forest.
+        """
+        return self._reachable(np.asarray(self.roots)[list(trees)], np.asarray(self.left), np.asarray(self.right))
+
+    def cap_depth(self, max_depth):
+        """
+        A new forest whose trees stop at `max_depth`; deeper nodes are dropped and the nodes at
+        the cap become leaves predicting their mean value.
+
+        Parameters:
+            max_depth (int): The maximum depth to keep.
+
+        Returns:
+            FlatForest: The shallower forest.
+        """
+        # Turn the nodes at the cap into leaves by pointing them at themselves
+        at_cap = np.flatnonzero(self.node_depths() >= max_depth)
+        left, right = np.array(self.left), np.array(self.right)
+        left[at_cap], right[at_cap] = at_cap, at_cap
+        return self._reachable(np.asarray(self.roots), left, right)
+
+    def save(self, directory):
+        """
+        Write the packed arrays as raw .npy files plus a small JSON header.
+
+        Parameters:
+            directory (str): The directory to write (created if needed).
+
+        Note:
+            - The traversal arrays are written too, so processes loading the forest map them
+              from the page cache instead of each building private copies on first predict.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._traversal_arrays()
+        for name in ARRAYS + TRAVERSAL_ARRAYS:
+            np.save(os.path.join(directory, f'{name.lstrip("_")}.npy'), getattr(self, name))
+        with open(os.path.join(directory, 'forest.json'), 'w') as f:
+            json.dump({'feature_names': self.feature_names, 'n_trees': self.n_trees}, f)
+
+    @staticmethod
+    def load(directory, mmap_mode='r'):
+        """
+        Load a forest written by `save`.
+
+        Parameters:
+            directory (str): The directory written by `save`.
+            mmap_mode (str, optional): Memory-map the arrays instead of reading them (default is 'r').
+                Pass None to read them into memory.
+
+        Returns:
+            FlatForest: The loaded forest.
+        """
+        with open(os.path.join(directory, 'forest.json')) as f:
+            header = json.load(f)
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode) for name in ARRAYS}
+        forest = FlatForest(feature_names=header['feature_names'], **arrays)
+
+        # Forests saved before the traversal arrays were stored build them on first predict
+        for name in TRAVERSAL_ARRAYS:
+            path = os.path.join(directory, f'{name.lstrip("_")}.npy')
+            if os.path.exists(path):
+                setattr(forest, name, np.load(path, mmap_mode=mmap_mode))
+        return forest
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def compile_forest(model):
+    """
+    Compile a fitted scikit-learn tree regressor or forest into a FlatForest.
+
+    Parameters:
+        model: A fitted RandomForestRegressor, ExtraTreesRegressor or DecisionTreeRegressor
+            (e.g. the model returned by `train_model` or `train_hyper`).
+
+    Returns:
+        FlatForest: The compiled forest.
+
+    Example:
+        rforest, results = train_hyper(RandomForestRegressor, X_train, y_train, X_val, y_val)
+        flat = compile_forest(rforest)
+        flat.predict(X_test)
+    """
+    estimators = getattr(model, 'estimators_', [model])
+
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    for estimator in estimators:
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count) + offset
+        is_leaf = tree.children_left == -1
+
+        # Shift child indices into the global node numbering; leaves point to themselves
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+        rights.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(tree.threshold)
+        values.append(tree.value[:, 0, 0])
+        roots.append(offset)
+
+        offset += tree.node_count
+
+    # Node indices fit in 32 bits for any forest that fits in memory
+    index_type = np.int32 if offset < 2 ** 31 else np.int64
+    feature_names = list(model.feature_names_in_) if hasattr(model, 'feature_names_in_') else None
+
+    return FlatForest(
+        feature=np.concatenate(features).astype(np.int32),
+        threshold=np.concatenate(thresholds).astype(np.float64),
+        left=np.concatenate(lefts).astype(index_type),
+        right=np.concatenate(rights).astype(index_type),
+        value=np.concatenate(values).astype(np.float64),
+        roots=np.array(roots, dtype=index_type),
+        feature_names=feature_names
+    )
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def compare_inference(model, X, repeats=5):
+    """
+    Compare scikit-learn and compiled-forest inference on the same rows.
+
+    Parameters:
+        model: A fitted forest.
+        X (pd.DataFrame): Rows to score, e.g. X_test.
+        repeats (int): Timing repeats; the best time is reported (default is 5).
+
+    Returns:
+        pd.DataFrame: Batch latency, single-row latency (ms), model size (MB) and the largest
+            absolute difference between the two predictors.
+    """
+    flat = compile_forest(model)
+
+    def best_time(predict, rows):
+        # Best of several runs, in milliseconds
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            predict(rows)
+            timings.append((time.perf_counter() - start) * 1000)
+        return min(timings)
+
+    return pd.DataFrame({
+        'Predictor': ['sklearn', 'flat'],
+        'Batch_ms': [best_time(model.predict, X), best_time(flat.predict, X)],
+        'Single_Row_ms': [best_time(model.predict, X.iloc[:1]), best_time(flat.predict, X.iloc[:1])],
+        'Size_MB': [len(pickle.dumps(model)) / 1024 ** 2, flat.nbytes / 1024 ** 2],
+        'Max_Abs_Diff': [0.0, float(np.max(np.abs(model.predict(X) - flat.predict(X))))]
+    })
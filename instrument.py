@@ -0,0 +1,202 @@
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; RSS is then left out
+    resource = None
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+# Whether stages are recorded, and whether peak memory is traced while they run
+ENABLED = False
+TRACE_MEMORY = True
+
+# Finished stages, in the order they ended
+_RECORDS = []
+
+# Open stages of the current thread, innermost last
+_LOCAL = threading.local()
+
+# Returned by `stage` while disabled, so a disabled stage costs one call and a no-op `with`
+_NULL_STAGE = contextlib.nullcontext()
+
+# Start of the clock used for trace timestamps
+_EPOCH = time.perf_counter()
+
+
+def enable(memory=True):
+    """
+    Start recording stages.
+
+    Parameters:
+        memory (bool): Also trace peak allocated memory with tracemalloc (default is True).
+            Tracing slows allocation-heavy code noticeably; pass False to record times only.
+    """
+    global ENABLED, TRACE_MEMORY
+    ENABLED, TRACE_MEMORY = True, memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    """
+    Stop recording stages (recorded stages are kept until `reset`).
+    """
+    global ENABLED
+    ENABLED = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def reset():
+    """
+    Forget every recorded stage.
+    """
+    _RECORDS.clear()
+
+
+def _rss_mb():
+    # Peak resident set size of the process so far (ru_maxrss is KB on Linux, bytes on macOS)
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 ** 2 if os.uname().sysname == 'Darwin' else rss / 1024
+
+
+@contextlib.contextmanager
+def _record(name):
+    stack = getattr(_LOCAL, 'stack', None)
+    if stack is None:
+        stack = _LOCAL.stack = []
+
+    tracing = TRACE_MEMORY and tracemalloc.is_tracing()
+    frame = {'name': name, 'peak': 0, 'start_mem': 0}
+    if tracing:
+        # Hand the peak so far to the enclosing stage before resetting it for this one
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+        frame['start_mem'] = current
+
+    parent = stack[-1]['name'] if stack else None
+    stack.append(frame)
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+        stack.pop()
+
+        peak_mb = None
+        if tracing and tracemalloc.is_tracing():
+            # Peak of this stage, including any nested stages, above what was allocated on entry
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            peak_mb = (peak - frame['start_mem']) / 1024 ** 2
+
+        _RECORDS.append({
+            'stage': name,
+            'parent': parent,
+            'depth': len(stack),
+            'start_s': start_wall - _EPOCH,
+            'wall_s': wall,
+            'cpu_s': cpu,
+            'peak_mb': peak_mb,
+            'rss_mb': _rss_mb(),
+            'thread': threading.get_ident()
+        })
+
+
+def stage(name):
+    """
+    Context manager timing one stage of a run while instrumentation is enabled.
+
+    Parameters:
+        name (str): The stage name, e.g. 'acquire', 'scale' or 'fit'.
+
+    Returns:
+        A context manager; while disabled, a shared no-op one.
+
+    Note:
+        - Records wall time, CPU time, peak traced memory above the stage's starting point
+          (nested stages count towards their parents) and the process's peak RSS.
+        - CPU time is the whole process's, so it includes any threads running alongside.
+
+    Example:
+        instrument.enable()
+        X_train, y_train, X_val, y_val, X_test, y_test = bravo_pipeline()
+        rforest, results = train_model(RandomForestRegressor, X_train, y_train, X_val, y_val)
+        instrument.summary()
+        instrument.to_chrome_trace('run.trace.json')
+    """
+    if not ENABLED:
+        return _NULL_STAGE
+    return _record(name)
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def records():
+    """
+    Every recorded stage as a DataFrame, in the order they started.
+    """
+    return pd.DataFrame(_RECORDS, columns=['stage', 'parent', 'depth', 'start_s', 'wall_s', 'cpu_s',
+                                           'peak_mb', 'rss_mb', 'thread']).sort_values('start_s', ignore_index=True)
+
+
+def summary():
+    """
+    Totals per stage name: calls, wall and CPU time, and the largest peak memory.
+    """
+    return records().groupby('stage', sort=False).agg(
+        calls=('wall_s', 'size'),
+        wall_s=('wall_s', 'sum'),
+        cpu_s=('cpu_s', 'sum'),
+        peak_mb=('peak_mb', 'max'),
+        rss_mb=('rss_mb', 'max')
+    )
+
+
+def to_json(path=None):
+    """
+    Export the recorded stages as JSON.
+
+    Parameters:
+        path (str, optional): File to write. Default is None (return the JSON string).
+    """
+    text = json.dumps(_RECORDS, indent=2)
+    if path is None:
+        return text
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def to_chrome_trace(path):
+    """
+    Export the recorded stages in Chrome trace format, for chrome://tracing or Perfetto.
+
+    Parameters:
+        path (str): File to write.
+    """
+    events = [{
+        'name': record['stage'],
+        'ph': 'X',
+        'ts': record['start_s'] * 1e6,
+        'dur': record['wall_s'] * 1e6,
+        'pid': os.getpid(),
+        'tid': record['thread'],
+        'args': {key: record[key] for key in ('cpu_s', 'peak_mb', 'rss_mb')}
+    } for record in _RECORDS]
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
@@ -0,0 +1,96 @@
+import argparse
+import json
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+from wrangle import acquire_wine
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def _post(url, payload):
+    # One JSON POST, returning the decoded reply
+    request = urllib.request.Request(url, data=payload, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def load_test(url='http://127.0.0.1:8000', concurrency=16, duration=10, rows_per_request=1, seed=42):
+    """
+    Hammer a running scoring service with concurrent requests and report client-side latency.
+
+    Parameters:
+        url (str): The service root (default is 'http://127.0.0.1:8000').
+        concurrency (int): Number of client threads sending back to back (default is 16).
+        duration (float): Seconds to run (default is 10).
+        rows_per_request (int): Rows in each request (default is 1).
+        seed (int): Seed for picking rows from the wine data (default is 42).
+
+    Returns:
+        dict: Client-side request count, errors, throughput and p50/p99 latency (ms),
+            plus the server's own /metrics.
+    """
+    rows = acquire_wine().drop(columns='quality').to_dict(orient='records')
+    rng = np.random.default_rng(seed)
+
+    # Pre-encode the request bodies so the client measures the server, not JSON encoding
+    payloads = [json.dumps([rows[i] for i in rng.integers(0, len(rows), rows_per_request)]).encode()
+                for _ in range(1000)]
+
+    latencies, errors = [], []
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(offset):
+        sent = offset
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                _post(f'{url}/predict', payloads[sent % len(payloads)])
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+            except Exception as error:
+                with lock:
+                    errors.append(str(error))
+            sent += 1
+
+    threads = [threading.Thread(target=client, args=(i * 37,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = np.array(latencies) * 1000
+    with urllib.request.urlopen(f'{url}/metrics') as response:
+        server = json.loads(response.read())
+
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput_rps': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+        'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+        'server': server,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test a running wine scoring service.')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--rows-per-request', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    report = load_test(args.url, args.concurrency, args.duration, args.rows_per_request)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
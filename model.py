@@ -4,10 +4,24 @@ from scipy import stats
 from sklearn.feature_selection import SelectKBest, f_regression, RFE
 from sklearn.linear_model import LinearRegression, Lasso
 
-from math import sqrt
-from sklearn.metrics import mean_squared_error
 
-from sklearn.ensemble import RandomForestRegressor
+from sklearn.ensemble import RandomForestRegressor, HistGradientBoostingRegressor
+from sklearn.model_selection import KFold, StratifiedKFold
+
+import time
+import inspect
+import pickle
+import tracemalloc
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import Pool, shared_memory
+
+from explore import data_pipeline, hist_pipeline, quality_tier_codes, QUALITY_LABELS
+from cache import TrialCache, data_fingerprint
+from store import ExperimentStore
+from instrument import stage
 
 
 # -----------------------------------------------------------------------------------------------
@@ -28,22 +42,24 @@ def eval_baseline(y_train):
         - It calculates the RMSE between the actual target values and the mean predictions.
         - The RMSE score quantifies the baseline model's performance.
     """
-    baselines = pd.DataFrame({'y_actual': y_train, 'y_mean': y_train.mean()})
+    # RMSE of the mean prediction is the population standard deviation of the target
+    y = np.asarray(y_train, dtype=float)
     
-    return float(f"{sqrt(mean_squared_error(baselines.y_actual, baselines.y_mean)):.4f}")
+    return round(float(np.sqrt(np.mean((y - y.mean()) ** 2))), 4)
 
         
 
 # -----------------------------------------------------------------------------------------------
 # -----------------------------------------------------------------------------------------------
 
-def eval_model(y_actual, y_hat):
+def eval_model(y_actual, y_hat, sample_weight=None):
     """
     Evaluate a model's performance using the root mean squared error (RMSE).
 
     Parameters:
         y_actual (pd.Series): The actual target values.
         y_hat (pd.Series or np.array): The predicted target values.
+        sample_weight (pd.Series or np.array, optional): Row weights, e.g. duplicate counts. Default is None.
 
     Returns:
         float: The RMSE score representing the model's performance.
@@ -52,9 +68,88 @@ def eval_model(y_actual, y_hat):
         - The function calculates the RMSE between the actual target values and the predicted values.
         - The RMSE score quantifies the model's performance, where lower values indicate better performance.
     """
-    return sqrt(mean_squared_error(y_actual, y_hat))
+    # Plain NumPy: no input validation overhead on every call
+    squared_error = (np.asarray(y_actual, dtype=float) - np.asarray(y_hat, dtype=float)) ** 2
+    return float(np.sqrt(np.average(squared_error, weights=sample_weight)))
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def evaluate_models(predictions, y_actual, model_names=None, model_results=None, split='val'):
+    """
+    Score many models' predictions on the same rows in one vectorized pass.
+
+    Parameters:
+        predictions (dict, pd.DataFrame or np.array): Model name -> predictions, a DataFrame with
+            one column per model, or a (models x rows) array.
+        y_actual (pd.Series or np.array): The actual quality scores.
+        model_names (list, optional): Names for the rows of an array. Default is None ('model_0', ...).
+        model_results (pd.DataFrame or ExperimentStore, optional): Results to append the metrics to.
+            Default is None.
+        split (str): 'train', 'val' or 'test'; names the RMSE column when appending to results
+            (Train_RMSE, Val_RMSE, Test_RMSE / train_rmse, ...) and is recorded with each stored
+            run (default is 'val').
+
+    Returns:
+        pd.DataFrame or ExperimentStore: Without `model_results`, one row per model with RMSE, MAE,
+            R2, Max_Error and the RMSE within each quality tier (RMSE_Low, RMSE_Med, RMSE_High), all
+            as numbers. With a results DataFrame, the same rows appended to it with RMSE renamed
+            for the split. With an ExperimentStore, every metric is logged as one run per model
+            and the store is returned, like `train_model` and `test_model`.
+
+    Note:
+        - Every metric comes from one (models x rows) error matrix; per-tier RMSE is a single
+          matrix product with the tier indicator matrix, so dozens of models cost about as
+          much as one.
+    """
+    # Stack into a (models x rows) matrix
+    if isinstance(predictions, dict):
+        model_names, matrix = list(predictions), np.vstack([np.asarray(p, dtype=float) for p in predictions.values()])
+    elif isinstance(predictions, pd.DataFrame):
+        model_names, matrix = list(predictions.columns), predictions.to_numpy(dtype=float).T
+    else:
+        matrix = np.atleast_2d(np.asarray(predictions, dtype=float))
+        model_names = model_names if model_names is not None else [f'model_{i}' for i in range(len(matrix))]
+
+    y = np.asarray(y_actual, dtype=float)
+    errors = matrix - y
+    squared = errors ** 2
+
+    # Per-tier mean squared error via the tier indicator matrix (rows outside every tier are left out)
+    codes = quality_tier_codes(y)
+    indicator = (codes[:, None] == np.arange(len(QUALITY_LABELS))).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        tier_rmse = np.sqrt((squared @ indicator) / indicator.sum(axis=0))
 
-def update_model_results(model_name, train_rmse, val_rmse, model_results=None):
+    metrics = pd.DataFrame({
+        'Model': model_names,
+        'RMSE': np.sqrt(squared.mean(axis=1)),
+        'MAE': np.abs(errors).mean(axis=1),
+        'R2': 1 - squared.sum(axis=1) / ((y - y.mean()) ** 2).sum(),
+        'Max_Error': np.abs(errors).max(axis=1),
+    })
+    for i, label in enumerate(QUALITY_LABELS):
+        metrics[f'RMSE_{label}'] = tier_rmse[:, i]
+
+    # Log one run per model, with every metric, to the experiment store
+    if isinstance(model_results, ExperimentStore):
+        for row in metrics.itertuples(index=False):
+            model_results.log_run(
+                model=row.Model, split=split, mae=float(row.MAE), r2=float(row.R2), max_error=float(row.Max_Error),
+                **{f'{split}_rmse': float(row.RMSE)},
+                **{f'rmse_{label.lower()}': float(getattr(row, f'RMSE_{label}')) for label in QUALITY_LABELS})
+        return model_results
+
+    # Appended rows fill the split's RMSE column of the results table (e.g. Val_RMSE)
+    if model_results is not None:
+        metrics = metrics.rename(columns={'RMSE': f'{split.capitalize()}_RMSE'})
+        return pd.concat([model_results, metrics], ignore_index=True)
+    return metrics
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def update_model_results(model_name, train_rmse, val_rmse, model_results=None, best_iteration=None, **details):
     """
     Update a DataFrame with model evaluation results (RMSE) for a given model.
 
@@ -63,21 +158,35 @@ def update_model_results(model_name, train_rmse, val_rmse, model_results=None):
         train_rmse (float): The root mean squared error (RMSE) on the training dataset.
         val_rmse (float): The root mean squared error (RMSE) on the validation dataset.
         model_results (pd.DataFrame, optional): An existing DataFrame containing model results. Default is None.
+        best_iteration (int, optional): Boosting rounds kept by early stopping, added as a
+            'Best_Iteration' column when given. Default is None.
+        **details: Extra run fields (feature_set, params, data_fingerprint, fit_time, predict_time,
+            peak_mem_mb, timing_traced), recorded when `model_results` is an ExperimentStore.
 
     Returns:
-        pd.DataFrame: An updated DataFrame with the new model's results.
+        pd.DataFrame or ExperimentStore: An updated DataFrame with the new model's results, or the store.
 
     Note:
         - The function creates a DataFrame with the model's name and RMSE results on the training and validation datasets.
         - If `model_results` is provided, it concatenates the new results with the existing DataFrame.
         - If `model_results` is not provided, it creates a new DataFrame to store the results.
+        - If `model_results` is an ExperimentStore, the run is appended to it instead of concatenated.
+        - RMSE values are stored as numbers so the table sorts numerically.
     """
+    # Append to the experiment store without rebuilding anything
+    if isinstance(model_results, ExperimentStore):
+        model_results.log_run(model=model_name, train_rmse=train_rmse, val_rmse=val_rmse,
+                              best_iteration=best_iteration, **details)
+        return model_results
+
     # Create a DataFrame with model name and RMSE results
     results_df = pd.DataFrame({
         'Model': [model_name],
         'Train_RMSE': [train_rmse],
         'Val_RMSE': [val_rmse]
     })
+    if best_iteration is not None:
+        results_df['Best_Iteration'] = [best_iteration]
     
     # Check if model_results already exists
     if model_results is not None:
@@ -92,7 +201,54 @@ def update_model_results(model_name, train_rmse, val_rmse, model_results=None):
 # -----------------------------------------------------------------------------------------------
 # -----------------------------------------------------------------------------------------------
 
-def train_model(model_name, X_train, y_train, X_val, y_val, model_results=None):
+def _early_stopping_fit_kwargs(model, rounds, X_val, y_val, val_weight=None):
+    """
+    Configure early stopping on the validation set for estimators that support it.
+
+    Returns:
+        dict: Extra keyword arguments for `model.fit` (empty when the estimator has no support).
+    """
+    model_class = type(model).__name__
+
+    if model_class == 'XGBRegressor':
+        # XGBoost evaluates every round on the eval set and keeps the best one
+        model.set_params(early_stopping_rounds=rounds)
+        fit_kwargs = {'eval_set': [(X_val, y_val)], 'verbose': False}
+        if val_weight is not None:
+            fit_kwargs['sample_weight_eval_set'] = [val_weight]
+        return fit_kwargs
+
+    if model_class == 'HistGradientBoostingRegressor':
+        model.set_params(early_stopping=True, n_iter_no_change=rounds)
+        # Newer scikit-learn versions accept an explicit validation set; older ones hold out
+        # `validation_fraction` of the training rows instead
+        if 'X_val' in inspect.signature(model.fit).parameters:
+            return {'X_val': X_val, 'y_val': y_val, 'sample_weight_val': val_weight}
+        return {}
+
+    return {}
+
+
+def _best_iteration(model):
+    """
+    Number of boosting rounds the early-stopped model predicts with, or None without early stopping.
+    """
+    model_class = type(model).__name__
+
+    # XGBoost predicts with the rounds up to and including the best one
+    if model_class == 'XGBRegressor' and model.get_params().get('early_stopping_rounds'):
+        return model.best_iteration + 1
+
+    # HistGradientBoosting keeps and predicts with every round it ran, including the
+    # n_iter_no_change rounds past the best one, so report all of them
+    if model_class == 'HistGradientBoostingRegressor' and model.early_stopping is True:
+        return model.n_iter_
+
+    return None
+
+
+def train_model(model_name, X_train, y_train, X_val, y_val, model_results=None, sample_weight=None, val_weight=None,
+                cache=None, early_stopping_rounds=None, feature_set=None, measure_memory=False):
     """
     Train a machine learning model, evaluate its performance, and update the model results DataFrame.
 
@@ -102,7 +258,19 @@ def train_model(model_name, X_train, y_train, X_val, y_val, model_results=None):
         y_train (pd.Series): The target variable of the training dataset.
         X_val (pd.DataFrame): The feature matrix of the validation dataset.
         y_val (pd.Series): The target variable of the validation dataset.
-        model_results (pd.DataFrame, optional): An existing DataFrame containing model results. Default is None.
+        model_results (pd.DataFrame or ExperimentStore, optional): An existing DataFrame containing model results,
+            or an experiment store to append the run to. Default is None.
+        sample_weight (pd.Series, optional): Training row weights, e.g. the 'n_copies' counts from
+            a compacted pipeline. Default is None.
+        val_weight (pd.Series, optional): Validation row weights used for the validation RMSE. Default is None.
+        cache (TrialCache or str, optional): A trial cache, or the directory of one. Default is None (no caching).
+        early_stopping_rounds (int, optional): Stop boosting after this many rounds without improvement
+            on the validation set (XGBRegressor, HistGradientBoostingRegressor). Default is None.
+        feature_set (str, optional): Label for the features used, recorded in an ExperimentStore.
+            Default is None, which records the comma-joined column names.
+        measure_memory (bool): With an ExperimentStore, trace the fit with tracemalloc to record its
+            peak memory (default is False). The logged timings are then flagged as traced, since
+            tracing slows allocation.
 
     Returns:
     model: Trained machine learning model.
@@ -115,42 +283,212 @@ def train_model(model_name, X_train, y_train, X_val, y_val, model_results=None):
         - The model name is extracted from the class and used for updating the model results DataFrame.
         - If `model_results` is provided, it is updated with the new model's results.
         - If `model_results` is not provided, a new DataFrame is created to store the results.
+        - With a cache, a fit with the same data, estimator class, parameters and random_state
+          returns the stored model and RMSE values instead of refitting.
+        - With early stopping, the best iteration is printed and recorded, and both RMSE values
+          come from the stopped model. Set a generous n_estimators / max_iter to let it stop.
     """
-    # Fit the model on the training data
     model = model_name()
-    model.fit(X_train, y_train)
-    
-    # Make predictions on the training set
-    train_preds = model.predict(X_train)
-    
-    # Calculate RMSE on the training set
-    train_rmse = eval_model(y_train, train_preds)
-    
-    # Make predictions on the validation set
-    val_preds = model.predict(X_val)
-    
-    # Calculate RMSE on the validation set
-    val_rmse = eval_model(y_val, val_preds)
+
+    # Hand the validation set to boosted models so they can stop early
+    fit_kwargs = {}
+    if early_stopping_rounds is not None:
+        fit_kwargs = _early_stopping_fit_kwargs(model, early_stopping_rounds, X_val, y_val, val_weight)
+
+    # Look the fit up in the trial cache first
+    cached = None
+    if cache is not None:
+        if isinstance(cache, str):
+            cache = TrialCache(cache)
+        cache_key = TrialCache.make_key(model, X_train, y_train, X_val, y_val, sample_weight, val_weight)
+        cached = cache.get(cache_key)
+
+    # Measure peak memory only when logging to an experiment store, since tracing slows allocation
+    logging_run = isinstance(model_results, ExperimentStore)
+    fit_time = predict_time = peak_mem_mb = None
+
+    # Instrumentation may already be tracing, in which case the timed fit is traced anyway
+    timing_traced = tracemalloc.is_tracing()
+
+    if cached is not None:
+        model, train_rmse, val_rmse = cached['model'], cached['train_rmse'], cached['val_rmse']
+    else:
+        # Trace the one real fit when asked to, leaving tracing alone if instrumentation started it
+        owns_trace = logging_run and measure_memory and not timing_traced
+        if owns_trace:
+            tracemalloc.start()
+            timing_traced = True
+        elif logging_run and timing_traced:
+            tracemalloc.reset_peak()
+
+        # Fit the model on the training data
+        # Only pass weights when given, since not every estimator accepts them (e.g. LassoLars)
+        start = time.perf_counter()
+        with stage('fit'):
+            if sample_weight is not None:
+                model.fit(X_train, y_train, sample_weight=sample_weight, **fit_kwargs)
+            else:
+                model.fit(X_train, y_train, **fit_kwargs)
+        fit_time = time.perf_counter() - start
+        
+        # Make predictions on the training set
+        with stage('predict'):
+            train_preds = model.predict(X_train)
+        
+        # Calculate RMSE on the training set
+        with stage('evaluate'):
+            train_rmse = eval_model(y_train, train_preds, sample_weight)
+        
+        # Make predictions on the validation set
+        start = time.perf_counter()
+        with stage('predict'):
+            val_preds = model.predict(X_val)
+        predict_time = time.perf_counter() - start
+        
+        # Calculate RMSE on the validation set
+        with stage('evaluate'):
+            val_rmse = eval_model(y_val, val_preds, val_weight)
+
+        # Peak memory of the traced run; its timings are flagged with timing_traced
+        if logging_run and timing_traced:
+            peak_mem_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        if owns_trace:
+            tracemalloc.stop()
+
+        if cache is not None:
+            cache.put(cache_key, {'model': model, 'train_rmse': train_rmse, 'val_rmse': val_rmse})
     
     # Print RMSE values for training and validation sets (formatted)
     train_rmse_formatted = "{:,.2f}".format(train_rmse)
     val_rmse_formatted = "{:,.2f}".format(val_rmse)
     print(f'The train RMSE is {train_rmse_formatted}.')
     print(f'The validate RMSE is {val_rmse_formatted}.')
+
+    # Report where early stopping settled
+    best_iteration = _best_iteration(model) if early_stopping_rounds is not None else None
+    if best_iteration is not None:
+        print(f'The best iteration is {best_iteration}.')
     
     # Extract the name of the model class without the module path
     model_name = model.__class__.__name__
 
+    # Run details for the experiment store
+    details = {}
+    if logging_run:
+        details = {
+            'feature_set': feature_set if feature_set is not None else ','.join(map(str, X_train.columns)),
+            'params': model.get_params(),
+            'data_fingerprint': data_fingerprint(X_train, y_train, X_val, y_val),
+            'fit_time': fit_time,
+            'predict_time': predict_time,
+            'peak_mem_mb': peak_mem_mb,
+            'timing_traced': int(timing_traced) if fit_time is not None else None
+        }
+
     # Update the model results DataFrame
-    model_results = update_model_results(model_name, train_rmse_formatted, val_rmse_formatted, model_results)
+    model_results = update_model_results(model_name, train_rmse, val_rmse, model_results, best_iteration, **details)
 
     return model, model_results
 
 
-def test_model(model, X_test, y_test, model_results=None):
+def bootstrap_rmse(y_actual, predictions, n_boot=2000, confidence=0.95, seed=42, max_cells=5_000_000):
+    """
+    Bootstrap confidence intervals for the RMSE of one or more models, with paired differences.
+
+    Parameters:
+        y_actual (pd.Series or np.array): The actual target values.
+        predictions (dict): Model name -> predictions on the same rows.
+        n_boot (int): Number of bootstrap resamples (default is 2,000).
+        confidence (float): Interval coverage (default is 0.95).
+        seed (int): Random seed (default is 42).
+        max_cells (int): Most resample indices held at once; resamples are drawn in chunks
+            of this size (default is 5,000,000).
+
+    Returns:
+        intervals (pd.DataFrame): RMSE, CI_Low and CI_High per model.
+        differences (pd.DataFrame): For every pair of models, the RMSE difference (first minus
+            second), its interval and the share of resamples where the first model was worse.
+
+    Note:
+        - Squared errors are computed once; each resample is just a row of indices into them,
+          and every model is scored on the same resamples, so differences are paired.
+    """
+    names = list(predictions)
+    y = np.asarray(y_actual, dtype=float)
+    squared = np.vstack([(np.asarray(predictions[name], dtype=float) - y) ** 2 for name in names])
+    n = len(y)
+
+    rng = np.random.default_rng(seed)
+    chunk = max(1, max_cells // n)
+    replicates = np.empty((len(names), n_boot))
+    for start in range(0, n_boot, chunk):
+        # A (resamples x rows) matrix of indices, shared by every model so differences are paired
+        idx = rng.integers(0, n, size=(min(chunk, n_boot - start), n), dtype=np.int32 if n < 2 ** 31 else np.int64)
+        for k in range(len(names)):
+            replicates[k, start:start + len(idx)] = np.sqrt(np.take(squared[k], idx).mean(axis=1))
+
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(replicates, [tail, 100 - tail], axis=1)
+    intervals = pd.DataFrame({
+        'Model': names,
+        'RMSE': np.sqrt(squared.mean(axis=1)),
+        'CI_Low': low,
+        'CI_High': high,
+    })
+
+    pairs = []
+    for a in range(len(names)):
+        for b in range(a + 1, len(names)):
+            diff = replicates[a] - replicates[b]
+            diff_low, diff_high = np.percentile(diff, [tail, 100 - tail])
+            pairs.append({
+                'Model': names[a],
+                'Versus': names[b],
+                'RMSE_Diff': intervals['RMSE'][a] - intervals['RMSE'][b],
+                'Diff_Low': diff_low,
+                'Diff_High': diff_high,
+                'Share_Worse': float((diff > 0).mean()),
+            })
+    differences = pd.DataFrame(pairs, columns=['Model', 'Versus', 'RMSE_Diff', 'Diff_Low', 'Diff_High', 'Share_Worse'])
+
+    return intervals, differences
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def test_model(model, X_test, y_test, model_results=None, feature_set=None, n_boot=0, confidence=0.95,
+               compare_to=None, seed=42):
+    """
+    Evaluate a trained model on the test set and add its RMSE to the results.
+
+    Parameters:
+        model: A trained model.
+        X_test (pd.DataFrame): The feature matrix of the test dataset.
+        y_test (pd.Series): The target variable of the test dataset.
+        model_results (pd.DataFrame or ExperimentStore, optional): An existing DataFrame containing model results,
+            or an experiment store to append the run to. Default is None.
+        feature_set (str, optional): Label for the features used, recorded in an ExperimentStore.
+            Default is None, which records the comma-joined column names.
+        n_boot (int): Bootstrap resamples for a confidence interval on the test RMSE (default is 0, none).
+        confidence (float): Interval coverage (default is 0.95).
+        compare_to (optional): Another fitted model, its test predictions, or a constant prediction
+            such as the training mean (the baseline). With `n_boot`, adds the paired RMSE difference
+            and its interval. Default is None.
+        seed (int): Random seed for the resamples (default is 42).
+
+    Returns:
+        pd.DataFrame or ExperimentStore: The updated results, with Test_RMSE stored as a number; with
+            `n_boot`, also Test_RMSE_Low / Test_RMSE_High and, with `compare_to`, Test_RMSE_Diff,
+            Diff_Low and Diff_High (lower-case columns in an ExperimentStore).
+
+    Example:
+        results = test_model(rforest, X_test, y_test, results, n_boot=5000, compare_to=y_train.mean())
+    """
     
     # Make predictions on the test set
+    start = time.perf_counter()
     test_preds = model.predict(X_test)
+    predict_time = time.perf_counter() - start
     
     # Calculate RMSE on the test set
     test_rmse = eval_model(y_test, test_preds)
@@ -163,10 +501,44 @@ def test_model(model, X_test, y_test, model_results=None):
     # Extract the name of the model class without the module path
     model_name = model.__class__.__name__
 
+    # Bootstrap interval from the test predictions, without predicting again
+    bootstrap_columns = {}
+    if n_boot:
+        predictions = {'model': test_preds}
+        if compare_to is not None:
+            if hasattr(compare_to, 'predict'):
+                predictions['other'] = compare_to.predict(X_test)
+            else:
+                predictions['other'] = np.broadcast_to(np.asarray(compare_to, dtype=float), len(test_preds))
+
+        intervals, differences = bootstrap_rmse(y_test, predictions, n_boot, confidence, seed)
+        bootstrap_columns['Test_RMSE_Low'] = intervals['CI_Low'][0]
+        bootstrap_columns['Test_RMSE_High'] = intervals['CI_High'][0]
+        print(f"The {confidence:.0%} interval is {bootstrap_columns['Test_RMSE_Low']:,.2f} "
+              f"to {bootstrap_columns['Test_RMSE_High']:,.2f}.")
+
+        if len(differences):
+            bootstrap_columns['Test_RMSE_Diff'] = differences['RMSE_Diff'][0]
+            bootstrap_columns['Diff_Low'] = differences['Diff_Low'][0]
+            bootstrap_columns['Diff_High'] = differences['Diff_High'][0]
+            print(f"The RMSE difference is {bootstrap_columns['Test_RMSE_Diff']:,.2f} "
+                  f"({bootstrap_columns['Diff_Low']:,.2f} to {bootstrap_columns['Diff_High']:,.2f}).")
+
+    # Append to the experiment store without rebuilding anything
+    if isinstance(model_results, ExperimentStore):
+        model_results.log_run(
+            model=model_name, test_rmse=test_rmse, predict_time=predict_time,
+            feature_set=feature_set if feature_set is not None else ','.join(map(str, X_test.columns)),
+            params=model.get_params() if hasattr(model, 'get_params') else None,
+            data_fingerprint=data_fingerprint(X_test, y_test),
+            **{column.lower(): value for column, value in bootstrap_columns.items()})
+        return model_results
+
     # Create a DataFrame with model name and RMSE results
     results_df = pd.DataFrame({
         'Model': [model_name],
-        'Test_RMSE': [test_rmse_formatted],
+        'Test_RMSE': [test_rmse],
+        **{column: [value] for column, value in bootstrap_columns.items()}
     })
     
     # Check if model_results already exists
@@ -180,7 +552,8 @@ def test_model(model, X_test, y_test, model_results=None):
     
     return model_results
 
-def train_hyper(model_name, X_train, y_train, X_val, y_val, model_results=None):
+def train_hyper(model_name, X_train, y_train, X_val, y_val, model_results=None, sample_weight=None, val_weight=None,
+                cache=None):
     """
     Train a machine learning model, evaluate its performance, and update the model results DataFrame.
 
@@ -191,51 +564,560 @@ def train_hyper(model_name, X_train, y_train, X_val, y_val, model_results=None):
         X_val (pd.DataFrame): The feature matrix of the validation dataset.
         y_val (pd.Series): The target variable of the validation dataset.
         model_results (pd.DataFrame, optional): An existing DataFrame containing model results. Default is None.
+        sample_weight (pd.Series, optional): Training row weights, e.g. the 'n_copies' counts from
+            a compacted pipeline. Default is None.
+        val_weight (pd.Series, optional): Validation row weights used for the validation RMSE. Default is None.
+        cache (TrialCache or str, optional): A trial cache, or the directory of one. Default is None (no caching).
 
     Returns:
     model: Trained machine learning model.
     model_results: Updated DataFrame containing model name and RMSE results.
 
     Note:
-        - The function trains a machine learning model on the provided training data.
-        - It evaluates the model's performance on both the training and validation sets using RMSE.
-        - RMSE values are printed for both sets in a formatted manner.
-        - The model name is extracted from the class and used for updating the model results DataFrame.
-        - If `model_results` is provided, it is updated with the new model's results.
-        - If `model_results` is not provided, a new DataFrame is created to store the results.
+        - Same as `train_model`, with the tuned RandomForest configuration
+          (max_depth=30, max_features='sqrt', n_estimators=300). See `search_hyper` to tune others.
     """
-    # Fit the model on the training data
-    model = model_name(
+    # Fit the model with the tuned hyperparameters
+    tuned_model = partial(
+    model_name,
     max_depth=30,
     max_features='sqrt',
     min_samples_leaf=1,
     min_samples_split=2,
     n_estimators=300
     )
+
+    return train_model(tuned_model, X_train, y_train, X_val, y_val, model_results,
+                       sample_weight=sample_weight, val_weight=val_weight, cache=cache)
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def compaction_report(model_name):
+    """
+    Compare fitting a model on the full pipeline against the compacted, weighted pipeline.
+
+    Parameters:
+        model_name (class): The machine learning model class (e.g., RandomForestRegressor).
+
+    Returns:
+        pd.DataFrame: Training rows, fit time (seconds) and validation RMSE for each variant.
+
+    Note:
+        - The compacted variant fits on unique rows with their duplicate counts as `sample_weight`.
+        - The two variants use different splits: the full one can put copies of a wine in both
+          train and val, which flatters its validation RMSE.
+    """
+    rows = []
+
+    # Full data, one row per copy
+    X_train, y_train, X_val, y_val, X_test, y_test = data_pipeline()
+    start = time.perf_counter()
+    model = model_name().fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+    rows.append(['full', len(X_train), fit_time, eval_model(y_val, model.predict(X_val))])
+
+    # Compacted data, duplicates collapsed into weights
+    X_train, y_train, w_train, X_val, y_val, w_val, X_test, y_test, w_test = data_pipeline(compact=True)
+    start = time.perf_counter()
+    model = model_name().fit(X_train, y_train, sample_weight=w_train)
+    fit_time = time.perf_counter() - start
+    rows.append(['compacted', len(X_train), fit_time, eval_model(y_val, model.predict(X_val), w_val)])
+
+    return pd.DataFrame(rows, columns=['Data', 'Train_Rows', 'Fit_Time', 'Val_RMSE'])
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+# Arrays attached from shared memory inside each pool worker
+_SHARED = {}
+
+
+def _share_arrays(arrays):
+    """
+    Copy named arrays into shared memory blocks once.
+
+    Returns:
+        blocks (list): The SharedMemory blocks (close and unlink them when done).
+        specs (dict): name -> (block name, shape, dtype), enough for a worker to attach.
+    """
+    blocks, specs = [], {}
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        block = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=block.buf)[...] = arr
+        blocks.append(block)
+        specs[name] = (block.name, arr.shape, arr.dtype.str)
+    return blocks, specs
+
+
+def _attach_shared(specs):
+    # Pool initializer: map every shared block as a read-only array without copying
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        arr = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        arr.flags.writeable = False
+        _SHARED[name] = (block, arr)
+
+
+def _shared(name):
+    return _SHARED[name][1]
+
+
+def _spec_parts(spec):
+    # A spec is an estimator class or an (estimator class, params dict) pair
+    if isinstance(spec, tuple):
+        return spec[0], dict(spec[1])
+    return spec, {}
+
+
+def _fit_spec(spec, return_model=False, n_samples=None):
+    """
+    Fit and score one estimator spec on the shared training and validation arrays,
+    optionally on only the first `n_samples` training rows.
+    """
+    model_class, params = _spec_parts(spec)
+    X_train, y_train = _shared('X_train')[:n_samples], _shared('y_train')[:n_samples]
+    X_val, y_val = _shared('X_val'), _shared('y_val')
+
+    # Time the fit
+    start = time.perf_counter()
+    model = model_class(**params)
     model.fit(X_train, y_train)
-    
-    # Make predictions on the training set
-    train_preds = model.predict(X_train)
-    
-    # Calculate RMSE on the training set
-    train_rmse = eval_model(y_train, train_preds)
-    
-    # Make predictions on the validation set
+    fit_time = time.perf_counter() - start
+
+    # Time the predictions on the validation set
+    start = time.perf_counter()
     val_preds = model.predict(X_val)
-    
-    # Calculate RMSE on the validation set
-    val_rmse = eval_model(y_val, val_preds)
-    
-    # Print RMSE values for training and validation sets (formatted)
-    train_rmse_formatted = "{:,.2f}".format(train_rmse)
-    val_rmse_formatted = "{:,.2f}".format(val_rmse)
-    print(f'The train RMSE is {train_rmse_formatted}.')
-    print(f'The validate RMSE is {val_rmse_formatted}.')
-    
-    # Extract the name of the model class without the module path
-    model_name = model.__class__.__name__
+    predict_time = time.perf_counter() - start
 
-    # Update the model results DataFrame
-    model_results = update_model_results(model_name, train_rmse_formatted, val_rmse_formatted, model_results)
+    row = {
+        'Model': model_class.__name__,
+        'Params': repr(params),
+        'Train_RMSE': eval_model(y_train, model.predict(X_train)),
+        'Val_RMSE': eval_model(y_val, val_preds),
+        'Fit_Time': fit_time,
+        'Predict_Time': predict_time
+    }
+    return row, (model if return_model else None)
 
-    return model, model_results
+
+def train_zoo(specs, X_train, y_train, X_val, y_val, n_jobs=None, return_models=False):
+    """
+    Fit many estimators concurrently in a process pool and collect one results table.
+
+    Parameters:
+        specs (list): Estimator classes, or (class, params) pairs,
+            e.g. [LinearRegression, (RandomForestRegressor, {'n_estimators': 300})].
+        X_train (pd.DataFrame): The feature matrix of the training dataset.
+        y_train (pd.Series): The target variable of the training dataset.
+        X_val (pd.DataFrame): The feature matrix of the validation dataset.
+        y_val (pd.Series): The target variable of the validation dataset.
+        n_jobs (int, optional): Number of worker processes. Default is None (one per CPU).
+        return_models (bool): Also return the fitted models (default is False).
+
+    Returns:
+        pd.DataFrame: One row per spec with Model, Params, Train_RMSE, Val_RMSE, Fit_Time and
+            Predict_Time (seconds), sorted by Val_RMSE.
+        list: The fitted models in the order of the results rows, so `models[i]` is described by
+            `results.iloc[i]`; only when `return_models` is True.
+
+    Note:
+        - The training and validation arrays are copied into shared memory once; workers map
+          them at startup instead of receiving a pickled copy with every task.
+        - Workers fit on NumPy arrays, so returned models do not carry feature names.
+    """
+    arrays = {
+        'X_train': np.asarray(X_train, dtype=float), 'y_train': np.asarray(y_train, dtype=float),
+        'X_val': np.asarray(X_val, dtype=float), 'y_val': np.asarray(y_val, dtype=float)
+    }
+    blocks, shared_specs = _share_arrays(arrays)
+
+    try:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_attach_shared,
+                                 initargs=(shared_specs,)) as pool:
+            futures = [pool.submit(_fit_spec, spec, return_models) for spec in specs]
+            outcomes = [future.result() for future in futures]
+    finally:
+        # Release the shared blocks once every worker is done
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    # Sort the rows and the models with the same permutation
+    results = pd.DataFrame([row for row, _ in outcomes])
+    order = np.argsort(results['Val_RMSE'].to_numpy(), kind='stable')
+    results = results.iloc[order].reset_index(drop=True)
+
+    if return_models:
+        return results, [outcomes[i][1] for i in order]
+    return results
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+# Default search spaces; the RandomForest space includes the configuration hardcoded in train_hyper
+HYPER_SPACES = {
+    'RandomForestRegressor': {
+        'max_depth': [10, 20, 30, None],
+        'max_features': ['sqrt', 0.5, 1.0],
+        'min_samples_leaf': [1, 2, 4],
+        'min_samples_split': [2, 5, 10],
+    },
+    'XGBRegressor': {
+        'max_depth': [3, 4, 6, 8],
+        'learning_rate': [0.03, 0.1, 0.3],
+        'subsample': [0.7, 0.85, 1.0],
+        'colsample_bytree': [0.7, 0.85, 1.0],
+    },
+}
+
+
+def search_hyper(model_name, X_train, y_train, X_val, y_val, param_space=None, n_trials=27,
+                 budget='n_samples', min_budget=None, max_budget=None, eta=3, n_jobs=None,
+                 time_limit=None, seed=42, model_results=None):
+    """
+    Tune any estimator used with `train_model` by successive halving under a time limit.
+
+    Parameters:
+        model_name (class): The machine learning model class (e.g., RandomForestRegressor).
+        X_train (pd.DataFrame): The feature matrix of the training dataset.
+        y_train (pd.Series): The target variable of the training dataset.
+        X_val (pd.DataFrame): The feature matrix of the validation dataset.
+        y_val (pd.Series): The target variable of the validation dataset.
+        param_space (dict, optional): Parameter name -> list of candidate values. Default is None,
+            which uses HYPER_SPACES for the model class.
+        n_trials (int): Number of random configurations in the first rung (default is 27).
+        budget (str): 'n_samples' to budget training rows, or an integer parameter such as
+            'n_estimators' to budget trees (default is 'n_samples').
+        min_budget (int, optional): Budget of the first rung. Default is None, which is
+            max_budget / eta**2.
+        max_budget (int, optional): Budget of the last rung. Default is None, which is all training
+            rows for 'n_samples' and 300 otherwise.
+        eta (int): Keep the best 1/eta of the trials at each rung and multiply the budget by eta (default is 3).
+        n_jobs (int, optional): Number of worker processes. Default is None (one per CPU).
+        time_limit (float, optional): Wall-clock limit in seconds for the search. Default is None.
+        seed (int): Random seed for sampling configurations and rows (default is 42).
+        model_results (pd.DataFrame, optional): An existing DataFrame containing model results. Default is None.
+
+    Returns:
+    model: The best configuration refit on the full training set at the full budget, or at the
+        budget of its best trial when the full refit would overrun the time limit.
+    trials: DataFrame with one row per trial and rung (params, budget, Val_RMSE, Fit_Time, status).
+    model_results: Updated DataFrame containing model name and RMSE results.
+
+    Note:
+        - Trials at each rung run in parallel over shared training arrays (see `train_zoo`) and
+          send back only their scores.
+        - When the time limit is hit, unfinished trials are recorded as 'timeout' and the worker
+          pool is terminated.
+        - With a time limit, the best trial from the highest rung reached is refit at the full
+          budget only if its fit time, scaled to the full budget, fits in the time left. Otherwise
+          it is refit at the budget it was scored at, which took about one trial's time.
+    """
+    rng = np.random.default_rng(seed)
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+
+    if param_space is None:
+        param_space = HYPER_SPACES[model_name.__name__]
+
+    # Budget range, geometric in eta
+    if max_budget is None:
+        max_budget = len(X_train) if budget == 'n_samples' else 300
+    if min_budget is None:
+        min_budget = max(int(max_budget / eta ** 2), 1)
+    n_rungs = int(np.floor(np.log(max_budget / min_budget) / np.log(eta) + 1e-9)) + 1
+
+    # Random configurations for the first rung
+    configs = [{name: values[rng.integers(len(values))] for name, values in param_space.items()}
+               for _ in range(n_trials)]
+    alive = list(range(n_trials))
+
+    # Shuffle the training rows once so each row budget is a random subset
+    order = rng.permutation(len(X_train))
+    arrays = {
+        'X_train': np.asarray(X_train, dtype=float)[order], 'y_train': np.asarray(y_train, dtype=float)[order],
+        'X_val': np.asarray(X_val, dtype=float), 'y_val': np.asarray(y_val, dtype=float)
+    }
+    blocks, shared_specs = _share_arrays(arrays)
+
+    log, best, timed_out = [], None, False
+    pool = Pool(n_jobs, initializer=_attach_shared, initargs=(shared_specs,))
+    try:
+        for rung in range(n_rungs):
+            rung_budget = int(min(min_budget * eta ** rung, max_budget))
+            if rung == n_rungs - 1:
+                rung_budget = max_budget
+
+            # Launch every surviving trial at this rung's budget
+            pending = {}
+            for trial in alive:
+                params = dict(configs[trial])
+                n_samples = None
+                if budget == 'n_samples':
+                    n_samples = rung_budget
+                else:
+                    params[budget] = rung_budget
+                pending[pool.apply_async(_fit_spec, ((model_name, params), False, n_samples))] = trial
+
+            # Wait for the rung, but no longer than the remaining time
+            for result in pending:
+                result.wait(None if deadline is None else max(deadline - time.perf_counter(), 0))
+            not_done = [result for result in pending if not result.ready()]
+
+            scores, rows = {}, {}
+            for result, trial in pending.items():
+                entry = {'Trial': trial, 'Rung': rung, 'Budget': rung_budget, 'Params': repr(configs[trial])}
+                if result.ready():
+                    row = rows[trial] = result.get()[0]
+                    scores[trial] = row['Val_RMSE']
+                    entry.update(Val_RMSE=row['Val_RMSE'], Fit_Time=row['Fit_Time'], Status='done')
+                else:
+                    entry.update(Val_RMSE=np.nan, Fit_Time=np.nan, Status='timeout')
+                log.append(entry)
+
+            if scores:
+                best_trial = min(scores, key=scores.get)
+                best = (best_trial, rows[best_trial], rung_budget)
+
+            # Stop at the deadline or when nothing finished; otherwise keep the best 1/eta
+            timed_out = bool(not_done)
+            if not_done or not scores:
+                break
+            keep = max(len(scores) // eta, 1)
+            alive = sorted(scores, key=scores.get)[:keep]
+    finally:
+        # Trials still running or queued past the deadline are killed, so they stop competing for the CPU
+        if timed_out:
+            pool.terminate()
+        else:
+            pool.close()
+        pool.join()
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    trials = pd.DataFrame(log)
+    if trials['Status'].eq('done').sum() == 0:
+        raise RuntimeError('No trial finished within the time limit.')
+
+    best_trial, best_row, best_budget = best
+
+    # Refit at the full budget only when the fit, scaled up from the best trial's, ends before the deadline
+    refit_budget = max_budget
+    if deadline is not None:
+        refit_estimate = best_row['Fit_Time'] * max_budget / best_budget
+        if time.perf_counter() + refit_estimate > deadline:
+            refit_budget = best_budget
+            print(f'No time left for a full refit; refitting at budget {best_budget}.')
+
+    best_params = dict(configs[best_trial])
+    if budget != 'n_samples':
+        best_params[budget] = refit_budget
+    print(f'Best parameters: {best_params}')
+
+    # Refit the best configuration on the budgeted rows (the same shuffled prefix the trials used)
+    if budget == 'n_samples' and refit_budget < len(X_train):
+        subset = order[:refit_budget]
+        X_train, y_train = X_train.iloc[subset], y_train.iloc[subset]
+    model, model_results = train_model(partial(model_name, **best_params), X_train, y_train, X_val, y_val, model_results)
+
+    return model, trials, model_results
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+# Fold assignments computed so far, keyed on the data size, target and fold settings
+_FOLD_CACHE = OrderedDict()
+
+
+def make_folds(y, n_splits=5, n_repeats=1, stratify=False, seed=42):
+    """
+    Precompute K-fold assignments once so many model comparisons can share them.
+
+    Parameters:
+        y (pd.Series): The target variable (used for its length, and for stratification).
+        n_splits (int): Number of folds (default is 5).
+        n_repeats (int): Number of times to repeat K-fold with different shuffles (default is 1).
+        stratify (bool): Keep the quality distribution the same in every fold (default is False).
+        seed (int): Random seed (default is 42).
+
+    Returns:
+        np.array: Shape (n_repeats, n_rows); entry [r, i] is the fold that row i is held out in
+            during repeat r.
+
+    Note:
+        - Results are cached, so repeated calls with the same target and settings are free.
+    """
+    y = np.asarray(y)
+    cache_key = (len(y), n_splits, n_repeats, stratify, seed, hash(y.tobytes()) if stratify else None)
+    if cache_key in _FOLD_CACHE:
+        return _FOLD_CACHE[cache_key]
+
+    folds = np.empty((n_repeats, len(y)), dtype=np.int16)
+    for repeat in range(n_repeats):
+        # A different shuffle per repeat, reproducible from the seed
+        if stratify:
+            splitter = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=seed + repeat)
+        else:
+            splitter = KFold(n_splits=n_splits, shuffle=True, random_state=seed + repeat)
+        for fold, (_, val_idx) in enumerate(splitter.split(np.zeros(len(y)), y)):
+            folds[repeat, val_idx] = fold
+
+    _FOLD_CACHE[cache_key] = folds
+    if len(_FOLD_CACHE) > 8:
+        _FOLD_CACHE.popitem(last=False)
+
+    return folds
+
+
+def _fit_fold(spec, repeat, fold):
+    """
+    Fit one estimator spec on every fold but one of the shared arrays and score the held-out fold.
+    """
+    model_class, params = _spec_parts(spec)
+    X, y = _shared('X'), _shared('y')
+    held_out = _shared('folds')[repeat] == fold
+
+    start = time.perf_counter()
+    model = model_class(**params)
+    model.fit(X[~held_out], y[~held_out])
+    fit_time = time.perf_counter() - start
+
+    return {
+        'Model': model_class.__name__,
+        'Params': repr(params),
+        'Repeat': repeat,
+        'Fold': fold,
+        'Val_RMSE': eval_model(y[held_out], model.predict(X[held_out])),
+        'Fit_Time': fit_time
+    }
+
+
+def cross_validate_models(specs, X, y, folds=None, n_jobs=None, return_folds=False, **fold_options):
+    """
+    Compare estimators by K-fold cross-validation with every fold fit in parallel.
+
+    Parameters:
+        specs (list): Estimator classes, or (class, params) pairs (see `train_zoo`).
+        X (pd.DataFrame): The feature matrix, e.g. X_train (or train and val combined).
+        y (pd.Series): The target variable.
+        folds (np.array, optional): Fold assignments from `make_folds`. Default is None, which
+            calls `make_folds(y, **fold_options)`.
+        n_jobs (int, optional): Number of worker processes. Default is None (one per CPU).
+        return_folds (bool): Also return the per-fold scores (default is False).
+        **fold_options: n_splits, n_repeats, stratify and seed passed to `make_folds`.
+
+    Returns:
+        pd.DataFrame: One row per spec with Mean_RMSE, Std_RMSE, the number of fits and the mean
+            Fit_Time, sorted by Mean_RMSE.
+        pd.DataFrame: The per-fold scores, only when `return_folds` is True.
+
+    Example:
+        folds = make_folds(y_train, n_splits=5, n_repeats=3, stratify=True)
+        cross_validate_models([LinearRegression, RandomForestRegressor], X_train, y_train, folds)
+    """
+    if folds is None:
+        folds = make_folds(y, **fold_options)
+
+    arrays = {'X': np.asarray(X, dtype=float), 'y': np.asarray(y, dtype=float), 'folds': folds}
+    blocks, shared_specs = _share_arrays(arrays)
+
+    # One task per (spec, repeat, fold)
+    n_repeats, n_splits = folds.shape[0], int(folds.max()) + 1
+    try:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_attach_shared,
+                                 initargs=(shared_specs,)) as pool:
+            futures = [pool.submit(_fit_fold, spec, repeat, fold)
+                       for spec in specs for repeat in range(n_repeats) for fold in range(n_splits)]
+            fold_results = pd.DataFrame([future.result() for future in futures])
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    # Mean and spread of the held-out RMSE per spec
+    summary = (fold_results.groupby(['Model', 'Params'], sort=False)
+               .agg(Mean_RMSE=('Val_RMSE', 'mean'), Std_RMSE=('Val_RMSE', 'std'),
+                    Fits=('Val_RMSE', 'size'), Fit_Time=('Fit_Time', 'mean'))
+               .sort_values('Mean_RMSE').reset_index())
+
+    if return_folds:
+        return summary, fold_results
+    return summary
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def train_hist(X_train, y_train, X_val, y_val, model_results=None, early_stopping_rounds=20, cache=None, **params):
+    """
+    Train a histogram-binned gradient boosting model with native handling of the 'type' category.
+
+    Parameters:
+        X_train (pd.DataFrame): Training features from `hist_pipeline`.
+        y_train (pd.Series): The target variable of the training dataset.
+        X_val (pd.DataFrame): Validation features from `hist_pipeline`.
+        y_val (pd.Series): The target variable of the validation dataset.
+        model_results (pd.DataFrame, optional): An existing DataFrame containing model results. Default is None.
+        early_stopping_rounds (int, optional): Early stopping patience on the validation set (default is 20).
+        cache (TrialCache or str, optional): A trial cache, or the directory of one. Default is None.
+        **params: Extra HistGradientBoostingRegressor parameters (e.g. learning_rate, max_leaf_nodes).
+
+    Returns:
+    model: Trained HistGradientBoostingRegressor.
+    model_results: Updated DataFrame containing model name and RMSE results.
+
+    Note:
+        - Features are binned into at most 255 bins once, so fit time grows roughly linearly with rows
+          and the model stores only its (shallow) trees.
+    """
+    # Mark the 'type' column as categorical
+    categorical = [col == 'type' for col in X_train.columns]
+
+    params = {'max_iter': 1000, **params}
+    hist_model = partial(HistGradientBoostingRegressor, categorical_features=categorical, **params)
+
+    return train_model(hist_model, X_train, y_train, X_val, y_val, model_results,
+                       cache=cache, early_stopping_rounds=early_stopping_rounds)
+
+
+def compare_engines():
+    """
+    Benchmark histogram gradient boosting against the tuned random forest.
+
+    Returns:
+        pd.DataFrame: Val_RMSE, Fit_Time and Predict_Time (seconds), and pickled Model_MB per engine.
+
+    Note:
+        - The forest uses the `train_hyper` configuration on dummy-encoded data (`data_pipeline`);
+          the boosting model uses `hist_pipeline`. Both see the same rows in every split.
+    """
+    rows = []
+
+    engines = [
+        ('RandomForestRegressor', data_pipeline,
+         lambda X: RandomForestRegressor(max_depth=30, max_features='sqrt', min_samples_leaf=1,
+                                         min_samples_split=2, n_estimators=300)),
+        ('HistGradientBoostingRegressor', hist_pipeline,
+         lambda X: HistGradientBoostingRegressor(max_iter=1000, early_stopping=True, n_iter_no_change=20,
+                                                 categorical_features=[col == 'type' for col in X.columns])),
+    ]
+
+    for name, pipeline, make_model in engines:
+        X_train, y_train, X_val, y_val, X_test, y_test = pipeline()
+        model = make_model(X_train)
+
+        # Time the fit
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_time = time.perf_counter() - start
+
+        # Time the validation predictions
+        start = time.perf_counter()
+        val_preds = model.predict(X_val)
+        predict_time = time.perf_counter() - start
+
+        rows.append([name, eval_model(y_val, val_preds), fit_time, predict_time,
+                     len(pickle.dumps(model)) / 1024 ** 2])
+
+    return pd.DataFrame(rows, columns=['Model', 'Val_RMSE', 'Fit_Time', 'Predict_Time', 'Model_MB'])
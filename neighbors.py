@@ -0,0 +1,286 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from sklearn.neighbors import KDTree, BallTree
+
+from wrangle import acquire_wine
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+class WineIndex:
+    """
+    Nearest-neighbour index over historical wines for "similar wines" lookups.
+
+    Parameters:
+        reference (pd.DataFrame): Acquired wines (chemistry, 'type' and 'quality' columns).
+        tree (str): 'kd' for a KDTree or 'ball' for a BallTree (default is 'kd').
+        leaf_size (int): Leaf size passed to the tree (default is 40).
+        rebuild_fraction (float): Rebuild the tree once the insert buffer reaches this fraction
+            of the indexed rows (default is 0.1).
+        max_buffer (int): Rebuild the tree once the insert buffer reaches this many rows,
+            whichever comes first (default is 10,000).
+
+    Note:
+        - Features are Min-Max scaled the same way as `bravo_pipeline`, and 'type' becomes 'type_white'.
+        - The scaler bounds are fitted once on the reference wines and reused for queries and inserts.
+        - Rows added with `add` go to a small buffer that is searched by brute force until the
+          next rebuild, so inserts do not pay for a full tree build every time.
+        - Index labels identify the wines in `query` results, so the reference labels should be
+          unique and added wines must bring labels not already in the index.
+    """
+
+    def __init__(self, reference, tree='kd', leaf_size=40, rebuild_fraction=0.1, max_buffer=10_000):
+        # Remember the tree settings for later rebuilds
+        self.tree_type = tree
+        self.leaf_size = leaf_size
+        self.rebuild_fraction = rebuild_fraction
+        self.max_buffer = max_buffer
+
+        # Feature columns are every numeric column except the target, plus the encoded type
+        self.features = [col for col in reference.select_dtypes(include=['float', 'int']).columns
+                         if col != 'quality'] + ['type_white']
+
+        # Fit the Min-Max bounds on the reference wines
+        X = self._encode(reference)
+        self.data_min_ = X.min(axis=0)
+        data_range = X.max(axis=0) - self.data_min_
+        self.scale_ = 1 / np.where(data_range == 0, 1, data_range)
+
+        # Store the scaled reference points, their quality scores and their index labels
+        self._points = self._scale(X)
+        self._quality = reference['quality'].to_numpy()
+        self._labels = reference.index.to_numpy()
+        self._buffer_points = np.empty((0, len(self.features)))
+        self._buffer_quality = np.empty(0, dtype=self._quality.dtype)
+        self._buffer_labels = self._labels[:0]
+
+        self._build()
+
+    def __len__(self):
+        return len(self._points) + len(self._buffer_points)
+
+    def _encode(self, df):
+        # Hot encode 'type' to match the pipeline's 'type_white' column
+        df = df.assign(type_white=(df['type'] == 'white').astype(float))
+        return df[self.features].to_numpy(dtype=float)
+
+    def _scale(self, X):
+        # Apply the stored Min-Max bounds
+        return (X - self.data_min_) * self.scale_
+
+    def _build(self):
+        # Build the tree over every indexed point
+        tree_class = KDTree if self.tree_type == 'kd' else BallTree
+        self._tree = tree_class(self._points, leaf_size=self.leaf_size)
+
+        # Hashed labels of the tree points, for the overlap check in `add`
+        self._label_index = pd.Index(self._labels)
+
+    def add(self, df):
+        """
+        Insert new graded wines into the index.
+
+        Parameters:
+            df (pd.DataFrame): Wines with the same columns as the reference data; their index
+                labels are what `query` reports as 'neighbor'.
+
+        Returns:
+            WineIndex: The index itself, so calls can be chained.
+
+        Note:
+            - Raises ValueError if a label repeats within `df` or is already in the index. A new
+              frame with a default RangeIndex (0, 1, ...) collides with a RangeIndex reference, so
+              give new wines their own labels first, e.g. IDs from the grading system.
+        """
+        # Reject labels that would make 'neighbor' ambiguous
+        clash = (df.index.duplicated() | df.index.isin(self._buffer_labels)
+                 | np.array([label in self._label_index for label in df.index], dtype=bool))
+        if clash.any():
+            raise ValueError(f'Index labels already in the index or repeated: {list(df.index[clash][:5])}')
+
+        # Append the scaled rows to the insert buffer
+        self._buffer_points = np.vstack([self._buffer_points, self._scale(self._encode(df))])
+        self._buffer_quality = np.concatenate([self._buffer_quality, df['quality'].to_numpy()])
+        self._buffer_labels = np.concatenate([self._buffer_labels, df.index.to_numpy()])
+
+        # Fold the buffer into the tree once it gets too large for brute force
+        if len(self._buffer_points) >= min(self.rebuild_fraction * len(self._points), self.max_buffer):
+            self.rebuild()
+
+        return self
+
+    def rebuild(self):
+        """
+        Merge the insert buffer into the tree and rebuild it.
+        """
+        self._points = np.vstack([self._points, self._buffer_points])
+        self._quality = np.concatenate([self._quality, self._buffer_quality])
+        self._labels = np.concatenate([self._labels, self._buffer_labels])
+        self._buffer_points = self._buffer_points[:0]
+        self._buffer_quality = self._buffer_quality[:0]
+        self._buffer_labels = self._buffer_labels[:0]
+        self._build()
+
+    def _query_scaled(self, X, k):
+        # Query the tree (dual-tree traversal pays off for larger batches)
+        dist, ind = self._tree.query(X, k=min(k, len(self._points)), dualtree=len(X) > 1000)
+
+        if len(self._buffer_points) == 0:
+            return dist, ind
+
+        # Brute force the buffer and offset its indices past the tree points
+        buf_sq = ((X ** 2).sum(axis=1)[:, None] + (self._buffer_points ** 2).sum(axis=1)[None, :]
+                  - 2 * X @ self._buffer_points.T)
+        buf_dist = np.sqrt(np.maximum(buf_sq, 0))
+        buf_ind = np.broadcast_to(np.arange(len(self._buffer_points)) + len(self._points), buf_dist.shape)
+
+        # Keep the k closest of the combined candidates
+        dist = np.hstack([dist, buf_dist])
+        ind = np.hstack([ind, buf_ind])
+        order = np.argsort(dist, axis=1)[:, :k]
+        return np.take_along_axis(dist, order, axis=1), np.take_along_axis(ind, order, axis=1)
+
+    def query(self, samples, k=5, n_jobs=1):
+        """
+        Find the k most similar historical wines for a batch of samples.
+
+        Parameters:
+            samples (pd.DataFrame): New wines with the chemistry and 'type' columns.
+            k (int): The number of neighbours per sample (default is 5).
+            n_jobs (int): Number of threads to split the batch across (default is 1).
+
+        Returns:
+            pd.DataFrame: One row per (sample, neighbour) with 'sample', 'rank', 'neighbor',
+                'distance' and 'quality' columns; 'neighbor' is the index label of the matched
+                wine in the reference (or added) frame, so `reference.loc[neighbor]` finds it.
+        """
+        X = self._scale(self._encode(samples))
+
+        # Split large batches across threads (the tree query releases the GIL)
+        if n_jobs > 1 and len(X) > n_jobs:
+            with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+                parts = list(pool.map(lambda part: self._query_scaled(part, k), np.array_split(X, n_jobs)))
+            dist = np.vstack([part[0] for part in parts])
+            ind = np.vstack([part[1] for part in parts])
+        else:
+            dist, ind = self._query_scaled(X, k)
+
+        # Look up the quality and index label of each neighbour across tree and buffer
+        quality, labels = self._quality, self._labels
+        if len(self._buffer_quality):
+            quality = np.concatenate([quality, self._buffer_quality])
+            labels = np.concatenate([labels, self._buffer_labels])
+
+        return pd.DataFrame({
+            'sample': np.repeat(samples.index.to_numpy(), dist.shape[1]),
+            'rank': np.tile(np.arange(1, dist.shape[1] + 1), len(X)),
+            'neighbor': labels[ind.ravel()],
+            'distance': dist.ravel(),
+            'quality': quality[ind.ravel()]
+        })
+
+    def save(self, path):
+        """
+        Persist the index (tree, scaler bounds and insert buffer) to disk.
+
+        Parameters:
+            path (str): The file to write.
+        """
+        joblib.dump(self, path)
+
+    @staticmethod
+    def load(path):
+        """
+        Load an index written by `save`.
+
+        Parameters:
+            path (str): The file to read.
+
+        Returns:
+            WineIndex: The restored index.
+        """
+        return joblib.load(path)
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def build_wine_index(df=None, tree='kd'):
+    """
+    Build a similar-wines index on the acquired data.
+
+    Parameters:
+        df (pd.DataFrame, optional): Acquired wines. Default is None, which calls `acquire_wine`.
+        tree (str): 'kd' or 'ball' (default is 'kd').
+
+    Returns:
+        WineIndex: The fitted index.
+
+    Note:
+        - The same outlier rules as the pipelines are applied (density <= 1.01, alcohol <= 14.04).
+    """
+    if df is None:
+        df = acquire_wine()
+
+    df = df[df.density <= 1.01]
+    df = df[df.alcohol <= 14.04]
+
+    return WineIndex(df, tree=tree)
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def benchmark_index(df=None, n_reference=1_000_000, n_queries=1_000, k=5, tree='kd', n_jobs=1, seed=42):
+    """
+    Time index build and batch queries on an upscaled reference set.
+
+    Parameters:
+        df (pd.DataFrame, optional): Acquired wines to upscale. Default is None, which calls `acquire_wine`.
+        n_reference (int): Number of reference wines to index (default is 1,000,000).
+        n_queries (int): Number of samples per query batch (default is 1,000).
+        k (int): Neighbours per sample (default is 5).
+        tree (str): 'kd' or 'ball' (default is 'kd').
+        n_jobs (int): Threads used for the batch query (default is 1).
+        seed (int): Random seed for the upscaling (default is 42).
+
+    Returns:
+        pd.DataFrame: Build time, batch query time and per-sample query time in milliseconds.
+
+    Note:
+        - Reference rows are resampled from the real wines with 1% Gaussian jitter on every
+          chemistry feature, so the index sees realistic but distinct points.
+    """
+    if df is None:
+        df = acquire_wine()
+
+    rng = np.random.default_rng(seed)
+
+    # Resample real rows and jitter the numeric features
+    reference = df.iloc[rng.integers(0, len(df), n_reference)].reset_index(drop=True)
+    numeric = [col for col in reference.select_dtypes(include=['float']).columns]
+    reference[numeric] = reference[numeric] * rng.normal(1, 0.01, (n_reference, len(numeric)))
+
+    samples = df.sample(n_queries, replace=True, random_state=seed).reset_index(drop=True)
+
+    # Time the build
+    start = time.perf_counter()
+    index = WineIndex(reference, tree=tree)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    # Time one batch query
+    start = time.perf_counter()
+    index.query(samples, k=k, n_jobs=n_jobs)
+    query_ms = (time.perf_counter() - start) * 1000
+
+    return pd.DataFrame({
+        'Tree': [tree],
+        'Reference_Rows': [n_reference],
+        'Batch_Size': [n_queries],
+        'Build_ms': [build_ms],
+        'Query_ms': [query_ms],
+        'Per_Sample_ms': [query_ms / n_queries]
+    })
@@ -0,0 +1,179 @@
+import time
+from collections import deque
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from sklearn.base import clone
+from sklearn.preprocessing import StandardScaler
+from sklearn.linear_model import SGDRegressor
+
+from model import eval_model
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+class OnlineLearner:
+    """
+    Update a regressor from new mini-batches without revisiting earlier data.
+
+    Parameters:
+        model (class, callable or estimator): The model class or `functools.partial` spec (as
+            passed to `train_model`), or an unfitted instance. Default is SGDRegressor.
+        X_val (pd.DataFrame, optional): Fixed validation features scored after every update.
+        y_val (pd.Series, optional): Fixed validation target.
+        window (int): Number of recent updates in the rolling RMSE (default is 7, a week of daily batches).
+        rounds (int): Trees added per update for boosting and forest models (default is 20).
+
+    Note:
+        - Models with `partial_fit` (SGDRegressor, ...) take one pass over each batch, after
+          the features are standardised with an incrementally updated scaler.
+        - XGBRegressor continues boosting from its previous booster on the new batch.
+        - HistGradientBoostingRegressor (and other boosting models) add a small booster fitted to
+          the current model's residuals on the new batch.
+        - Forests with `warm_start` (RandomForestRegressor, ExtraTreesRegressor) grow `rounds`
+          new trees on the new batch and keep the old ones.
+        - Each batch is scored before the model sees it, so 'batch_rmse' is an honest
+          estimate of how the model does on the day's new samples.
+
+    Example:
+        learner = OnlineLearner(SGDRegressor, X_val=X_val, y_val=y_val)
+        learner.update(X_day, y_day)
+        learner.history()
+    """
+
+    def __init__(self, model=SGDRegressor, X_val=None, y_val=None, window=7, rounds=20):
+        # Estimator instances are cloned; classes and partial specs are called
+        is_instance = hasattr(model, 'fit') and not isinstance(model, type)
+        self.model = clone(model) if is_instance else model()
+        self.X_val, self.y_val = X_val, y_val
+        self.window = window
+        self.rounds = rounds
+
+        model_class = self.model.__class__.__name__
+        if hasattr(self.model, 'partial_fit'):
+            self.mode = 'partial_fit'
+            self.scaler = StandardScaler()
+        elif model_class == 'XGBRegressor':
+            self.mode = 'continue'
+            self.model.set_params(n_estimators=rounds)
+        elif 'Boosting' in model_class:
+            self.mode = 'residual'
+            # Each stage is a small booster of `rounds` trees
+            rounds_param = 'max_iter' if 'max_iter' in self.model.get_params() else 'n_estimators'
+            self.model.set_params(**{rounds_param: rounds})
+            self.stages = []
+            self.base = 0.0
+        elif 'warm_start' in self.model.get_params():
+            self.mode = 'grow'
+            self.model.set_params(warm_start=True, n_estimators=0)
+        else:
+            raise ValueError(f'{model_class} supports neither partial_fit, continued boosting nor warm_start')
+
+        self.n_seen = 0
+        self.fitted = False
+        self._history = []
+        self._recent = deque(maxlen=window)
+
+    def predict(self, X):
+        """
+        Predict with the current model.
+        """
+        if self.mode == 'partial_fit':
+            return self.model.predict(self.scaler.transform(X))
+        if self.mode == 'residual':
+            # Initial mean plus every stage's residual correction
+            return self.base + sum(stage.predict(X) for stage in self.stages)
+        return self.model.predict(X)
+
+    def update(self, X, y):
+        """
+        Learn from one new mini-batch and record its metrics.
+
+        Parameters:
+            X (pd.DataFrame): The new batch's features, with the training columns.
+            y (pd.Series): The new batch's target.
+
+        Returns:
+            dict: The metrics recorded for this update.
+        """
+        # Score the batch before learning from it
+        batch_rmse = eval_model(y, self.predict(X)) if self.fitted else np.nan
+
+        start = time.perf_counter()
+        if self.mode == 'partial_fit':
+            self.scaler.partial_fit(X)
+            self.model.partial_fit(self.scaler.transform(X), y)
+        elif self.mode == 'continue':
+            # Start boosting from the existing trees
+            booster = self.model.get_booster() if self.fitted else None
+            self.model.fit(X, y, xgb_model=booster)
+        elif self.mode == 'residual':
+            if not self.fitted:
+                self.base = float(np.mean(y))
+            stage = clone(self.model).fit(X, np.asarray(y) - self.predict(X))
+            self.stages.append(stage)
+        else:
+            self.model.set_params(n_estimators=self.model.n_estimators + self.rounds)
+            self.model.fit(X, y)
+        update_time = time.perf_counter() - start
+
+        self.fitted = True
+        self.n_seen += len(X)
+
+        record = {'update': len(self._history) + 1, 'n_rows': len(X), 'n_seen': self.n_seen,
+                  'update_time': update_time, 'batch_rmse': batch_rmse}
+
+        if self.X_val is not None:
+            record['val_rmse'] = eval_model(self.y_val, self.predict(self.X_val))
+            self._recent.append(record['val_rmse'])
+            record['rolling_val_rmse'] = float(np.mean(self._recent))
+
+        self._history.append(record)
+        return record
+
+    def history(self):
+        """
+        The metrics of every update so far as a DataFrame.
+        """
+        return pd.DataFrame(self._history)
+
+    def save(self, path):
+        """
+        Save the learner, so tomorrow's update can continue from today's state.
+        """
+        joblib.dump(self, path)
+
+    @staticmethod
+    def load(path):
+        """
+        Load a learner written by `save`.
+        """
+        return joblib.load(path)
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def replay_online(model, X_train, y_train, X_val, y_val, batch_size=500, **options):
+    """
+    Feed the training set to an OnlineLearner in arrival-sized batches, as a dry run of daily updates.
+
+    Parameters:
+        model (class, callable or estimator): The model to train online (see `OnlineLearner`).
+        X_train (pd.DataFrame): Training features, in the order they would arrive.
+        y_train (pd.Series): Training target.
+        X_val (pd.DataFrame): Validation features.
+        y_val (pd.Series): Validation target.
+        batch_size (int): Rows per simulated day (default is 500).
+        **options: Passed to OnlineLearner (window, rounds).
+
+    Returns:
+        learner (OnlineLearner): The trained learner.
+        history (pd.DataFrame): Metrics after every update.
+    """
+    learner = OnlineLearner(model, X_val, y_val, **options)
+    for start in range(0, len(X_train), batch_size):
+        learner.update(X_train.iloc[start:start + batch_size], y_train.iloc[start:start + batch_size])
+
+    return learner, learner.history()
@@ -0,0 +1,344 @@
+import numpy as np
+import pandas as pd
+
+from wrangle import acquire_wine, acquire_wine_chunks
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+class QuantileSketch:
+    """
+    Mergeable KLL-style sketch for approximate quantiles of a stream of numbers.
+
+    Parameters:
+        k (int): Capacity of the top compactor; larger values are more accurate (default is 200).
+        seed (int, optional): Seed for the random compaction offsets. Default is None.
+
+    Note:
+        - Level h holds values that each stand for 2**h original values.
+        - When a level overflows it is sorted and every other value is promoted to the next level.
+        - The rank error is roughly 1.7 / k with high probability, independent of stream length.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        # Lower levels get geometrically smaller capacities
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+
+                # Sort the level and keep an odd leftover value in place
+                values = np.sort(self.levels[level])
+                leftover = values[len(values) - len(values) % 2:]
+                values = values[:len(values) - len(values) % 2]
+
+                # Promote every other value, starting at a random offset
+                promoted = values[self._rng.integers(2)::2]
+                self.levels[level] = leftover
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+
+                # Capacities shift when a level is added, so restart from the bottom
+                level = 0
+            else:
+                level += 1
+
+    def update(self, values):
+        """
+        Add a batch of values to the sketch (NaNs are ignored).
+        """
+        values = np.asarray(values, dtype=float)
+        self.levels[0] = np.concatenate([self.levels[0], values[~np.isnan(values)]])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """
+        Combine another sketch into this one.
+        """
+        for level, values in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], values])
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """
+        Estimate the quantile(s) q (between 0 and 1).
+        """
+        values = np.concatenate(self.levels)
+        if len(values) == 0:
+            return np.full(np.shape(q), np.nan)
+
+        # Weight each value by the number of original values it represents
+        weights = np.concatenate([np.full(len(level_values), 2.0 ** level) for level, level_values in enumerate(self.levels)])
+        order = np.argsort(values)
+        cum_weights = np.cumsum(weights[order])
+
+        # Find the first value whose cumulative weight reaches the target rank
+        ranks = np.asarray(q) * cum_weights[-1]
+        positions = np.minimum(np.searchsorted(cum_weights, ranks), len(values) - 1)
+        return values[order][positions]
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def _merge_moments(a, b):
+    """
+    Combine two sets of central moments (n, mean, M2, M3, M4) with the pairwise update formulas.
+    """
+    n_a, mean_a, m2_a, m3_a, m4_a = a
+    n_b, mean_b, m2_b, m3_b, m4_b = b
+
+    n = n_a + n_b
+    # Avoid dividing by zero for columns or groups neither side has seen
+    safe_n = np.where(n == 0, 1, n)
+    delta = mean_b - mean_a
+
+    mean = mean_a + delta * n_b / safe_n
+    m2 = m2_a + m2_b + delta ** 2 * n_a * n_b / safe_n
+    m3 = (m3_a + m3_b + delta ** 3 * n_a * n_b * (n_a - n_b) / safe_n ** 2
+          + 3 * delta * (n_a * m2_b - n_b * m2_a) / safe_n)
+    m4 = (m4_a + m4_b + delta ** 4 * n_a * n_b * (n_a ** 2 - n_a * n_b + n_b ** 2) / safe_n ** 3
+          + 6 * delta ** 2 * (n_a ** 2 * m2_b + n_b ** 2 * m2_a) / safe_n ** 2
+          + 4 * delta * (n_a * m3_b - n_b * m3_a) / safe_n)
+
+    # Columns with no data on one side simply take the other side's mean
+    mean = np.where(n_a == 0, mean_b, np.where(n_b == 0, mean_a, mean))
+
+    return n, mean, m2, m3, m4
+
+
+def _chunk_moments(X):
+    """
+    Compute (n, mean, M2, M3, M4) per column of a 2-D array, ignoring NaNs.
+    """
+    valid = ~np.isnan(X)
+    n = valid.sum(axis=0).astype(float)
+    mean = np.where(n > 0, np.nansum(X, axis=0) / np.where(n == 0, 1, n), 0.0)
+
+    # Centered sums of powers with missing values contributing zero
+    centered = np.where(valid, X - mean, 0.0)
+    squared = centered ** 2
+
+    return n, mean, squared.sum(axis=0), (squared * centered).sum(axis=0), (squared ** 2).sum(axis=0)
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+class WineProfile:
+    """
+    Mergeable single-pass profile of the wine data.
+
+    Parameters:
+        columns (list): Numeric columns to profile.
+        by (tuple): Columns to break the means and counts down by (default is ('type', 'quality')).
+        k (int): Quantile sketch capacity (default is 200).
+        seed (int): Seed for the quantile sketches (default is 42).
+
+    Note:
+        - Every statistic is updated from the same chunk, so each chunk is scanned once.
+        - Profiles built from separate files can be combined with `merge` or `+` without rescanning.
+    """
+
+    def __init__(self, columns, by=('type', 'quality'), k=200, seed=42):
+        self.columns = list(columns)
+        self.by = tuple(by)
+        self.rows = 0
+
+        # Per-column counters, extremes and moments
+        size = len(self.columns)
+        self.nulls = np.zeros(size)
+        self.min = np.full(size, np.inf)
+        self.max = np.full(size, -np.inf)
+        self.moments = (np.zeros(size), np.zeros(size), np.zeros(size), np.zeros(size), np.zeros(size))
+
+        # One quantile sketch per column
+        self.sketches = {col: QuantileSketch(k=k, seed=seed) for col in self.columns}
+
+        # Per-group moments for each breakdown column, stored as (n, mean, M2) frames
+        self.groups = {key: None for key in self.by}
+
+    def update(self, df):
+        """
+        Add one chunk of wines to the profile.
+
+        Parameters:
+            df (pd.DataFrame): A chunk with the profiled columns and breakdown columns.
+
+        Returns:
+            WineProfile: The profile itself.
+        """
+        X = df[self.columns].to_numpy(dtype=float)
+        self.rows += len(X)
+
+        # Nulls and extremes
+        self.nulls += np.isnan(X).sum(axis=0)
+        if len(X):
+            self.min = np.fmin(self.min, np.nanmin(np.where(np.isnan(X), np.inf, X), axis=0))
+            self.max = np.fmax(self.max, np.nanmax(np.where(np.isnan(X), -np.inf, X), axis=0))
+
+        # Moments
+        self.moments = _merge_moments(self.moments, _chunk_moments(X))
+
+        # Quantile sketches
+        for i, col in enumerate(self.columns):
+            self.sketches[col].update(X[:, i])
+
+        # Group breakdowns, one groupby per breakdown column
+        for key in self.by:
+            grouped = df.groupby(key, observed=True)[self.columns]
+            n = grouped.count().astype(float)
+            mean = grouped.mean()
+            m2 = grouped.var(ddof=0) * n
+            self.groups[key] = self._merge_groups(self.groups[key], (n, mean, m2.fillna(0)))
+
+        return self
+
+    @staticmethod
+    def _merge_groups(a, b):
+        # Align both sides on the union of group values before merging
+        if a is None:
+            return b
+        index = a[0].index.union(b[0].index)
+        a = [frame.reindex(index, fill_value=0) for frame in a]
+        b = [frame.reindex(index, fill_value=0) for frame in b]
+
+        # Reuse the moment formulas with zero higher moments
+        zeros = np.zeros(a[0].shape)
+        n, mean, m2, _, _ = _merge_moments(
+            (a[0].to_numpy(), a[1].to_numpy(), a[2].to_numpy(), zeros, zeros),
+            (b[0].to_numpy(), b[1].to_numpy(), b[2].to_numpy(), zeros, zeros))
+
+        columns = a[0].columns
+        return (pd.DataFrame(n, index=index, columns=columns),
+                pd.DataFrame(mean, index=index, columns=columns),
+                pd.DataFrame(m2, index=index, columns=columns))
+
+    def merge(self, other):
+        """
+        Combine another profile of the same columns into this one.
+
+        Parameters:
+            other (WineProfile): A profile built from different rows.
+
+        Returns:
+            WineProfile: The profile itself.
+        """
+        self.rows += other.rows
+        self.nulls = self.nulls + other.nulls
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        self.moments = _merge_moments(self.moments, other.moments)
+
+        for col in self.columns:
+            self.sketches[col].merge(other.sketches[col])
+
+        for key in self.by:
+            self.groups[key] = self._merge_groups(self.groups[key], other.groups[key])
+
+        return self
+
+    def __add__(self, other):
+        # Merge into a deep copy so neither operand changes
+        import copy
+        return copy.deepcopy(self).merge(other)
+
+    def summary(self, quantiles=(0.25, 0.5, 0.75)):
+        """
+        Describe-style summary of every profiled column.
+
+        Parameters:
+            quantiles (tuple): Quantiles to estimate from the sketches (default is the quartiles).
+
+        Returns:
+            pd.DataFrame: One row per column with count, nulls, mean, std, skew, kurtosis,
+                min, quantiles and max.
+        """
+        n, mean, m2, m3, m4 = self.moments
+        safe_n = np.where(n == 0, 1, n)
+
+        summary = pd.DataFrame({
+            'count': n,
+            'nulls': self.nulls,
+            'mean': mean,
+            'std': np.sqrt(m2 / np.where(n > 1, n - 1, 1)),
+        }, index=self.columns)
+
+        # Population skewness and excess kurtosis from the central moments
+        with np.errstate(divide='ignore', invalid='ignore'):
+            summary['skew'] = np.sqrt(safe_n) * m3 / m2 ** 1.5
+            summary['kurtosis'] = safe_n * m4 / m2 ** 2 - 3
+
+        summary['min'] = self.min
+        for q in quantiles:
+            summary[f'{q:.0%}'] = [self.sketches[col].quantile(q) for col in self.columns]
+        summary['max'] = self.max
+
+        return summary
+
+    def breakdown(self, key):
+        """
+        Counts and means of every profiled column for each value of a breakdown column.
+
+        Parameters:
+            key (str): One of the breakdown columns, e.g. 'type' or 'quality'.
+
+        Returns:
+            pd.DataFrame: Means per group with a leading 'count' column.
+        """
+        n, mean, _ = self.groups[key]
+        breakdown = mean.copy()
+        breakdown.insert(0, 'count', n.max(axis=1).astype(int))
+        return breakdown.sort_index()
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def profile_wine(data=None, chunksize=None, by=('type', 'quality'), k=200):
+    """
+    Profile the wine data in a single pass.
+
+    Parameters:
+        data (pd.DataFrame or iterable, optional): A DataFrame, or an iterable of DataFrame chunks
+            such as `acquire_wine_chunks()`. Default is None, which calls `acquire_wine`,
+            or `acquire_wine_chunks` when a chunksize is given.
+        chunksize (int, optional): Split a DataFrame (or the CSV stream) into chunks of this size.
+        by (tuple): Breakdown columns (default is ('type', 'quality')).
+        k (int): Quantile sketch capacity (default is 200).
+
+    Returns:
+        WineProfile: The mergeable profile.
+
+    Example:
+        profile = profile_wine(chunksize=100_000)
+        profile.summary()
+        profile.breakdown('quality')
+    """
+    if data is None:
+        data = acquire_wine() if chunksize is None else acquire_wine_chunks(chunksize)
+
+    # Treat a single frame as one chunk (or several, when a chunksize is given)
+    if isinstance(data, pd.DataFrame):
+        frame, step = data, chunksize or max(len(data), 1)
+        data = (frame.iloc[start:start + step] for start in range(0, len(frame), step))
+
+    profile = None
+    for chunk in data:
+        if profile is None:
+            # Profile every numeric column that isn't a breakdown key
+            columns = [col for col in chunk.select_dtypes(include=['number']).columns if col not in by]
+            profile = WineProfile(columns, by=by, k=k)
+        profile.update(chunk)
+
+    return profile
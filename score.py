@@ -0,0 +1,218 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+from serve import load_bundle
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+# The model bundle of each worker process, loaded once by `_init_worker`
+_BUNDLE = {}
+
+
+def _init_worker(bundle_path):
+    # Load the model and preprocessing once per worker; forests are memory-mapped, so every
+    # worker shares one copy of the trees
+    _BUNDLE['model'], _BUNDLE['prep'] = load_bundle(bundle_path)
+
+
+def _score_chunk(chunk, wine_type=None, keep_columns=()):
+    """
+    Worker: preprocess and score one chunk of raw rows.
+    """
+    model, prep = _BUNDLE['model'], _BUNDLE['prep']
+
+    # Same column clean-up as acquire_wine, so the lab's raw CSVs can be scored directly
+    chunk.columns = [col.lower().replace(' ', '_').replace('.', '_') for col in chunk.columns]
+    if wine_type is not None:
+        chunk['type'] = wine_type
+
+    scored = chunk[list(keep_columns)].copy()
+    scored.insert(0, 'row', chunk.index)
+    scored['prediction'] = model.predict(prep.transform(chunk))
+    scored['valid'] = prep.valid(chunk)
+    return scored
+
+
+async def score_file(bundle_path, input_path, output_path, chunksize=100_000, n_jobs=None, wine_type=None,
+                     keep_columns=(), max_in_flight=None):
+    """
+    Score a wine CSV of any size chunk by chunk, overlapping reading, scoring and writing.
+
+    Parameters:
+        bundle_path (str): A model bundle directory written by `serve.save_bundle` / `serve.train_bundle`.
+        input_path (str): The CSV to score, with raw or cleaned column names.
+        output_path (str): The CSV to write: row number, any kept columns, prediction and
+            valid (False for rows breaking the outlier rules).
+        chunksize (int): Rows per chunk (default is 100,000).
+        n_jobs (int, optional): Scoring processes. Default is None (one per CPU).
+        wine_type (str, optional): 'red' or 'white' for files without a 'type' column. Default is None.
+        keep_columns (tuple): Input columns (cleaned names) copied to the output, e.g. a tank id.
+        max_in_flight (int, optional): Chunks read ahead of the writer. Default is None (two per worker).
+
+    Returns:
+        int: The number of rows scored.
+
+    Note:
+        - A reader thread parses the next chunks while the worker processes score earlier ones
+          and a writer thread appends finished chunks in input order, so the file is never fully
+          in memory: at most `max_in_flight` chunks are held at once.
+        - A read, scoring or write error stops the run and is raised to the caller.
+    """
+    loop = asyncio.get_running_loop()
+    n_jobs = os.cpu_count() if n_jobs is None else n_jobs
+    max_in_flight = 2 * n_jobs if max_in_flight is None else max_in_flight
+
+    reader = pd.read_csv(input_path, chunksize=chunksize)
+    pending = asyncio.Queue(maxsize=max_in_flight)
+    n_rows = 0
+
+    # One thread for reading and one for writing, so neither blocks the event loop
+    with ThreadPoolExecutor(max_workers=1) as read_pool, ThreadPoolExecutor(max_workers=1) as write_pool, \
+            ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(bundle_path,)) as pool:
+
+        async def produce():
+            try:
+                while True:
+                    chunk = await loop.run_in_executor(read_pool, next, reader, None)
+                    if chunk is None:
+                        break
+                    # Queue the scoring future; put() waits once max_in_flight chunks are outstanding
+                    await pending.put(loop.run_in_executor(pool, _score_chunk, chunk, wine_type, keep_columns))
+            finally:
+                # Always end the queue, so the writer stops even when reading fails; the read
+                # error itself is re-raised by `await producer`
+                await pending.put(None)
+
+        producer = asyncio.create_task(produce())
+
+        try:
+            with open(output_path, 'w', newline='') as f:
+                while True:
+                    future = await pending.get()
+                    if future is None:
+                        break
+                    scored = await future
+                    await loop.run_in_executor(write_pool,
+                                               lambda: scored.to_csv(f, header=(n_rows == 0), index=False))
+                    n_rows += len(scored)
+        except BaseException:
+            # Stop reading, drop the chunks not yet scored and let the producer finish, so the
+            # writer's error reaches the caller instead of leaving the producer blocked
+            producer.cancel()
+            while not pending.empty():
+                future = pending.get_nowait()
+                if future is not None:
+                    future.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+            raise
+
+        await producer
+
+    return n_rows
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+class AsyncScoringClient:
+    """
+    Asyncio client for the HTTP scoring service in `serve.py`.
+
+    Parameters:
+        url (str): The service root (default is 'http://127.0.0.1:8000').
+        concurrency (int): Most requests in flight at once (default is 32).
+
+    Note:
+        - Uses plain asyncio streams, so no HTTP library is needed. Many single-row requests in
+          flight at once let the server's micro-batcher fill its batches.
+
+    Example:
+        client = AsyncScoringClient()
+        predictions = asyncio.run(client.predict_many(rows))
+    """
+
+    def __init__(self, url='http://127.0.0.1:8000', concurrency=32):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.semaphore = None
+        self.concurrency = concurrency
+
+    async def _request(self, method, path, body=b''):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n'
+                         f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+
+        head, _, payload = response.partition(b'\r\n\r\n')
+        status = int(head.split(b' ', 2)[1])
+        reply = json.loads(payload)
+        if status != 200:
+            raise ValueError(reply.get('error', f'HTTP {status}'))
+        return reply
+
+    async def predict(self, rows):
+        """
+        Score a list of raw rows (dicts) in one request.
+
+        Returns:
+            predictions (list): The predicted quality of each row.
+            valid (list): False for rows breaking the outlier rules.
+        """
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        async with self.semaphore:
+            reply = await self._request('POST', '/predict', json.dumps(rows).encode())
+        return reply['predictions'], reply['valid']
+
+    async def predict_many(self, rows, rows_per_request=1):
+        """
+        Score many rows as concurrent requests of `rows_per_request` rows each.
+
+        Returns:
+            list: One prediction per row, in input order.
+        """
+        requests = [rows[start:start + rows_per_request] for start in range(0, len(rows), rows_per_request)]
+        replies = await asyncio.gather(*(self.predict(request) for request in requests))
+        return [prediction for predictions, _ in replies for prediction in predictions]
+
+    async def metrics(self):
+        """
+        The server's latency and throughput metrics.
+        """
+        return await self._request('GET', '/metrics')
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score a wine CSV in parallel chunks.')
+    parser.add_argument('bundle', help='Model bundle directory written by serve.save_bundle / serve.train_bundle.')
+    parser.add_argument('input', help='CSV of raw wine measurements.')
+    parser.add_argument('output', help='CSV to write the predictions to.')
+    parser.add_argument('--chunksize', type=int, default=100_000)
+    parser.add_argument('--jobs', type=int, default=None)
+    parser.add_argument('--type', choices=['red', 'white'], default=None,
+                        help="Wine type for files without a 'type' column.")
+    parser.add_argument('--keep', nargs='*', default=(), help='Input columns to copy to the output.')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    n_rows = asyncio.run(score_file(args.bundle, args.input, args.output, args.chunksize, args.jobs,
+                                    args.type, args.keep))
+    elapsed = time.perf_counter() - start
+    print(f'Scored {n_rows:,} rows in {elapsed:.1f} s ({n_rows / elapsed:,.0f} rows/s).')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from sklearn.ensemble import RandomForestRegressor
+
+from wrangle import acquire_wine, wine_train_val_test
+from explore import WinePrep
+from model import train_model
+from artifacts import save_model, load_model
+from cache import PredictionCache
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def save_bundle(path, model, prep):
+    """
+    Save a fitted model together with the WinePrep that builds its features, as an artifact
+    directory (see `artifacts.save_model`).
+    """
+    save_model(model, path, prep)
+
+
+def load_bundle(path, mmap_mode='r', flat=None):
+    """
+    Load a bundle written by `save_bundle`, memory-mapping its large arrays.
+
+    Parameters:
+        path (str): The bundle directory.
+        mmap_mode (str, optional): Passed to `artifacts.load_model` (default is 'r').
+        flat (bool, optional): Passed to `artifacts.load_model`; False loads a forest as the
+            scikit-learn estimator, which is faster on large batches but not shared between processes.
+
+    Returns:
+        model: The fitted model (a FlatForest for forests, unless flat is False).
+        prep (WinePrep): The fitted preprocessing.
+    """
+    return load_model(path, mmap_mode=mmap_mode, flat=flat)
+
+
+def train_bundle(path, model_name=RandomForestRegressor, new_features=False, scale=True, cluster=True):
+    """
+    Fit the preprocessing on the training split, train a model with `train_model` and save both.
+
+    Parameters:
+        path (str): The bundle directory to write.
+        model_name (class): The model class (default is RandomForestRegressor).
+        new_features, scale, cluster (bool): WinePrep options (defaults match `bravo_pipeline`).
+
+    Returns:
+        pd.DataFrame: The train and validation RMSE from `train_model`.
+    """
+    train, val, _ = wine_train_val_test(acquire_wine())
+    prep = WinePrep(new_features, scale, cluster).fit(train)
+
+    train, val = train[prep.valid(train)], val[prep.valid(val)]
+    model, results = train_model(model_name, prep.transform(train), train.quality, prep.transform(val), val.quality)
+
+    save_bundle(path, model, prep)
+    return results
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+class MicroBatcher:
+    """
+    Coalesce concurrent scoring requests into vectorized batches.
+
+    Parameters:
+        model: A fitted model.
+        prep (WinePrep): The fitted preprocessing for the model.
+        max_batch (int): Most rows scored in one call (default is 256).
+        max_wait_ms (float): Longest a request waits for others to join its batch (default is 2).
+        window (int): Number of recent requests kept for the latency percentiles (default is 10,000).
+        cache_size (int): Rows kept in a PredictionCache in front of the model (default is 0, no cache).
+
+    Note:
+        - One worker thread takes the first waiting request, then keeps collecting until the batch
+          is full or `max_wait_ms` has passed, and scores everything with one transform and predict.
+        - Under light load a request waits at most `max_wait_ms`; under heavy load batches fill
+          up and the per-row cost drops.
+    """
+
+    def __init__(self, model, prep, max_batch=256, max_wait_ms=2, window=10_000, cache_size=0):
+        self.model = model
+        self.cache = PredictionCache(model, cache_size) if cache_size else None
+        self.prep = prep
+        self.max_batch = max_batch
+        self._measurements = [col for col in prep.input_columns if col != 'type']
+        self.max_wait = max_wait_ms / 1000
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._finished = deque(maxlen=window)
+        self._batch_sizes = deque(maxlen=window)
+        self.n_requests = 0
+        self.n_rows = 0
+        self.n_failed = 0
+        self.started = time.perf_counter()
+
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, rows):
+        """
+        Queue a list of raw rows (dicts) for scoring.
+
+        Returns:
+            Future: Resolves to (predictions, valid) lists for the rows.
+
+        Note:
+            - Rows missing a column, or with a measurement that is not a number, raise ValueError
+              here, so one bad request never fails the batch it would have joined.
+        """
+        try:
+            rows = [self._coerce(row) for row in rows]
+        except ValueError:
+            with self._lock:
+                self.n_failed += 1
+            raise
+
+        future = Future()
+        self._queue.put((rows, future, time.perf_counter()))
+        return future
+
+    def predict(self, rows):
+        """
+        Score a list of raw rows (dicts), waiting for the result.
+        """
+        return self.submit(rows).result()
+
+    def _coerce(self, row):
+        # Check one raw row and convert its measurements to floats
+        if not isinstance(row, dict):
+            raise ValueError(f'Rows must be JSON objects, got {row!r}')
+        missing = [col for col in self.prep.input_columns if col not in row]
+        if missing:
+            raise ValueError(f'Missing columns: {missing}')
+
+        row = dict(row)
+        for col in self._measurements:
+            try:
+                row[col] = float(row[col])
+            except (TypeError, ValueError):
+                raise ValueError(f'Column {col!r} is not a number: {row[col]!r}') from None
+        return row
+
+    def _run(self):
+        while True:
+            # Block for the first request, then gather more until the batch is full or time is up
+            batch = [self._queue.get()]
+            n_rows = len(batch[0][0])
+            deadline = time.perf_counter() + self.max_wait
+            while n_rows < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                n_rows += len(item[0])
+
+            self._score(batch)
+
+    def _predict(self, rows):
+        df = pd.DataFrame(rows)
+        predictor = self.cache if self.cache is not None else self.model
+        return predictor.predict(self.prep.transform(df)).tolist(), self.prep.valid(df).tolist()
+
+    def _score(self, batch):
+        rows = [row for request_rows, _, _ in batch for row in request_rows]
+        try:
+            predictions, valid = self._predict(rows)
+        except Exception as error:
+            if len(batch) > 1:
+                # A row got past submit's checks: score each request on its own, so only the
+                # bad one fails
+                for item in batch:
+                    self._score([item])
+                return
+            batch[0][1].set_exception(error)
+            with self._lock:
+                self.n_failed += 1
+            return
+
+        # Hand each request back its own slice
+        now = time.perf_counter()
+        start = 0
+        for request_rows, future, queued in batch:
+            end = start + len(request_rows)
+            future.set_result((predictions[start:end], valid[start:end]))
+            start = end
+
+        with self._lock:
+            self._latencies.extend(now - queued for _, _, queued in batch)
+            self._finished.extend([now] * len(batch))
+            self._batch_sizes.append(len(rows))
+            self.n_requests += len(batch)
+            self.n_rows += len(rows)
+
+    def metrics(self):
+        """
+        Latency percentiles (ms), recent throughput, batch sizes and failed requests.
+        """
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            finished = np.array(self._finished)
+            batch_sizes = np.array(self._batch_sizes)
+
+        # Throughput over the span of the recent requests
+        span = finished.max() - finished.min() if len(finished) > 1 else 0
+        return {
+            'requests': self.n_requests,
+            'rows': self.n_rows,
+            'failed': self.n_failed,
+            'uptime_s': time.perf_counter() - self.started,
+            'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+            'throughput_rps': len(finished) / span if span else None,
+            'mean_batch_rows': float(batch_sizes.mean()) if len(batch_sizes) else None,
+            'cache': self.cache.stats() if self.cache is not None else None,
+        }
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def make_handler(batcher):
+    """
+    Build the HTTP request handler around a MicroBatcher.
+
+    Endpoints:
+        POST /predict: A JSON row (or list of rows) of raw wine measurements and 'type';
+            returns {"predictions": [...], "valid": [...]} where valid is False for outliers.
+        GET /metrics: The batcher's latency and throughput metrics.
+        GET /health: {"status": "ok"}.
+    """
+
+    class ScoringHandler(BaseHTTPRequestHandler):
+
+        def _reply(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == '/metrics':
+                self._reply(200, batcher.metrics())
+            elif self.path == '/health':
+                self._reply(200, {'status': 'ok'})
+            else:
+                self._reply(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path != '/predict':
+                self._reply(404, {'error': 'not found'})
+                return
+
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                rows = body if isinstance(body, list) else [body]
+                predictions, valid = batcher.predict(rows)
+            except Exception as error:
+                self._reply(400, {'error': str(error)})
+                return
+
+            self._reply(200, {'predictions': predictions, 'valid': valid})
+
+        def log_message(self, format, *args):
+            # Per-request logging would dominate the cost of a single-row request
+            pass
+
+    return ScoringHandler
+
+
+class ScoringServer(ThreadingHTTPServer):
+    # A deeper accept backlog than the default 5, so bursts of concurrent clients are not refused
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def serve(bundle_path, host='127.0.0.1', port=8000, max_batch=256, max_wait_ms=2, cache_size=0):
+    """
+    Load a model bundle once and serve it over HTTP until interrupted.
+
+    Parameters:
+        bundle_path (str): A bundle written by `save_bundle` / `train_bundle`.
+        host (str): Interface to bind (default is '127.0.0.1').
+        port (int): Port to listen on (default is 8000).
+        max_batch (int): Most rows per micro-batch (default is 256).
+        max_wait_ms (float): Longest a request waits to be batched (default is 2).
+        cache_size (int): Rows kept in the prediction cache (default is 0, no cache).
+    """
+    model, prep = load_bundle(bundle_path)
+    batcher = MicroBatcher(model, prep, max_batch, max_wait_ms, cache_size=cache_size)
+
+    server = ScoringServer((host, port), make_handler(batcher))
+    print(f'Serving {model.__class__.__name__} on http://{host}:{port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve a trained wine quality model over HTTP.')
+    parser.add_argument('bundle', help='Model bundle directory written by save_bundle / train_bundle.')
+    parser.add_argument('--train', action='store_true', help='Train and save a RandomForest bundle first.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch', type=int, default=256)
+    parser.add_argument('--max-wait-ms', type=float, default=2)
+    parser.add_argument('--cache-size', type=int, default=0, help='Rows kept in the prediction cache.')
+    args = parser.parse_args(argv)
+
+    if args.train:
+        train_bundle(args.bundle)
+    serve(args.bundle, args.host, args.port, args.max_batch, args.max_wait_ms, args.cache_size)
+
+
+if __name__ == '__main__':
+    main()
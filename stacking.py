@@ -0,0 +1,235 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from sklearn.linear_model import LinearRegression, LassoLars, TweedieRegressor, RidgeCV
+from sklearn.ensemble import RandomForestRegressor
+
+from cache import data_fingerprint
+from model import (train_model, evaluate_models, make_folds, _share_arrays, _attach_shared, _shared,
+                   _spec_parts)
+
+try:
+    from xgboost import XGBRegressor
+except ImportError:
+    XGBRegressor = None
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+# The base models compared in the notebooks (XGBoost only when it is installed)
+BASE_SPECS = [
+    LinearRegression,
+    (LassoLars, {'alpha': 0.01}),
+    (TweedieRegressor, {'power': 0, 'alpha': 0.1, 'max_iter': 1000}),
+    (RandomForestRegressor, {'n_estimators': 300, 'max_depth': 30, 'max_features': 'sqrt', 'random_state': 42}),
+] + ([(XGBRegressor, {'n_estimators': 300, 'max_depth': 4, 'learning_rate': 0.1, 'random_state': 42})]
+     if XGBRegressor is not None else [])
+
+
+def _spec_name(spec):
+    # Readable column name for a spec: the class name, plus its params when there are any
+    model_class, params = _spec_parts(spec)
+    if not params:
+        return model_class.__name__
+    return f"{model_class.__name__}({', '.join(f'{k}={v!r}' for k, v in sorted(params.items()))})"
+
+
+def _fit_oof_fold(spec, fold):
+    """
+    Fit a spec on every fold but one of the shared training arrays and predict the held-out fold.
+    """
+    model_class, params = _spec_parts(spec)
+    X, y = _shared('X'), _shared('y')
+    held_out = _shared('folds') == fold
+
+    model = model_class(**params)
+    model.fit(X[~held_out], y[~held_out])
+    return fold, model.predict(X[held_out])
+
+
+def base_predictions(specs, X_train, y_train, X_val, y_val, folds=None, cache_dir='.stack_cache', n_jobs=None,
+                     model_results=None, **fold_options):
+    """
+    Out-of-fold training predictions and full-fit validation predictions for every base model,
+    cached on disk.
+
+    Parameters:
+        specs (list): Estimator classes, or (class, params) pairs (see `train_zoo`).
+        X_train (pd.DataFrame): The feature matrix of the training dataset.
+        y_train (pd.Series): The target variable of the training dataset.
+        X_val (pd.DataFrame): The feature matrix of the validation dataset.
+        y_val (pd.Series): The target variable of the validation dataset.
+        folds (np.array, optional): Fold assignments from `make_folds`; only the first repeat is
+            used. Default is None, which calls `make_folds(y_train, **fold_options)`.
+        cache_dir (str): Where cached predictions live (default is '.stack_cache').
+        n_jobs (int, optional): Worker processes for the fold fits. Default is None (one per CPU).
+        model_results (pd.DataFrame, optional): Results that the full fits are added to.
+        **fold_options: n_splits, stratify and seed passed to `make_folds`.
+
+    Returns:
+        oof (pd.DataFrame): One column per base model with its out-of-fold training predictions.
+        val_preds (pd.DataFrame): One column per base model with the validation predictions of
+            the model fitted on the whole training set.
+        models (dict): Column name -> base model fitted on the whole training set.
+        model_results (pd.DataFrame): The results table with a row per newly fitted base model.
+
+    Note:
+        - Entries are keyed on the spec, the data fingerprint and the folds, so only new base
+          models (or new data) are ever fitted; the full fit goes through `train_model`.
+    """
+    if folds is None:
+        folds = make_folds(y_train, **fold_options)
+    fold_ids = np.asarray(folds)[0] if np.ndim(folds) == 2 else np.asarray(folds)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    fingerprint = data_fingerprint(X_train, y_train, X_val, y_val, fold_ids)
+
+    oof, val_preds, models, missing = {}, {}, {}, []
+    for spec in specs:
+        name = _spec_name(spec)
+        model_class, params = _spec_parts(spec)
+        config = f'{model_class.__module__}.{model_class.__qualname__}:{sorted((k, repr(v)) for k, v in params.items())}'
+        path = os.path.join(cache_dir, hashlib.sha256((config + fingerprint).encode()).hexdigest() + '.joblib')
+
+        if os.path.exists(path):
+            entry = joblib.load(path)
+            oof[name], val_preds[name], models[name] = entry['oof'], entry['val'], entry['model']
+        else:
+            missing.append((spec, name, path))
+
+    if missing:
+        # Every (new spec, fold) pair runs in parallel on shared copies of the training arrays
+        arrays = {'X': np.asarray(X_train, dtype=float), 'y': np.asarray(y_train, dtype=float), 'folds': fold_ids}
+        blocks, shared_specs = _share_arrays(arrays)
+        try:
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_attach_shared,
+                                     initargs=(shared_specs,)) as pool:
+                futures = {name: [pool.submit(_fit_oof_fold, spec, fold) for fold in np.unique(fold_ids)]
+                           for spec, name, _ in missing}
+                for name, fold_futures in futures.items():
+                    oof[name] = np.empty(len(fold_ids))
+                    for future in fold_futures:
+                        fold, predictions = future.result()
+                        oof[name][fold_ids == fold] = predictions
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+        # Full fits on the whole training set, recorded like any other model
+        for spec, name, path in missing:
+            model_class, params = _spec_parts(spec)
+            models[name], model_results = train_model(partial(model_class, **params), X_train, y_train,
+                                                      X_val, y_val, model_results)
+            val_preds[name] = models[name].predict(X_val)
+            joblib.dump({'oof': oof[name], 'val': val_preds[name], 'model': models[name]}, path)
+
+    names = [_spec_name(spec) for spec in specs]
+    oof = pd.DataFrame({name: oof[name] for name in names}, index=X_train.index)
+    val_preds = pd.DataFrame({name: val_preds[name] for name in names}, index=X_val.index)
+
+    return oof, val_preds, {name: models[name] for name in names}, model_results
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+# Meta-learners tried by `compare_blends`
+META_LEARNERS = {
+    'linear_positive': lambda: LinearRegression(positive=True),
+    'ridge': lambda: RidgeCV(alphas=np.logspace(-3, 3, 13)),
+    'linear': LinearRegression,
+}
+
+
+def compare_blends(oof, y_train, val_preds, y_val, meta_learners=None):
+    """
+    Try blend strategies on the cached prediction matrices; no base model is refitted.
+
+    Parameters:
+        oof (pd.DataFrame): Out-of-fold predictions from `base_predictions`.
+        y_train (pd.Series): The training target.
+        val_preds (pd.DataFrame): Validation predictions from `base_predictions`.
+        y_val (pd.Series): The validation target.
+        meta_learners (dict, optional): Name -> factory returning an unfitted regressor. Default is
+            None, which uses META_LEARNERS.
+
+    Returns:
+        comparison (pd.DataFrame): Validation metrics from `evaluate_models` for every base model,
+            the plain average, the best single model by out-of-fold RMSE, and every meta-learner.
+        metas (dict): Name -> meta-learner fitted on the out-of-fold matrix.
+    """
+    meta_learners = META_LEARNERS if meta_learners is None else meta_learners
+    y = np.asarray(y_train, dtype=float)
+
+    predictions = {name: val_preds[name].to_numpy() for name in val_preds.columns}
+    predictions['mean'] = val_preds.to_numpy().mean(axis=1)
+
+    # Best single model, chosen on the out-of-fold predictions rather than the validation set
+    oof_rmse = np.sqrt(((oof.to_numpy() - y[:, None]) ** 2).mean(axis=0))
+    predictions['best_oof'] = predictions[oof.columns[int(np.argmin(oof_rmse))]]
+
+    metas = {}
+    for name, factory in meta_learners.items():
+        metas[name] = factory().fit(oof, y)
+        predictions[f'stack_{name}'] = metas[name].predict(val_preds)
+
+    comparison = evaluate_models(predictions, y_val).sort_values('RMSE', ignore_index=True)
+    return comparison, metas
+
+
+class StackingEnsemble:
+    """
+    Base models fitted on the whole training set, blended by a meta-learner fitted on their
+    out-of-fold predictions.
+
+    Parameters:
+        models (dict): Column name -> fitted base model, as returned by `base_predictions`.
+        meta: A meta-learner fitted on the out-of-fold matrix with the same columns.
+    """
+
+    def __init__(self, models, meta):
+        self.models = models
+        self.meta = meta
+
+    def base_matrix(self, X):
+        """
+        Every base model's predictions, one column per model.
+        """
+        return pd.DataFrame({name: model.predict(X) for name, model in self.models.items()}, index=X.index)
+
+    def predict(self, X):
+        return self.meta.predict(self.base_matrix(X))
+
+
+def build_stack(X_train, y_train, X_val, y_val, specs=None, meta='linear_positive', model_results=None, **options):
+    """
+    Build a stacking ensemble over the notebooks' base models.
+
+    Parameters:
+        X_train, y_train, X_val, y_val: The splits from `data_pipeline` (or another pipeline).
+        specs (list, optional): Base model specs. Default is None, which uses BASE_SPECS.
+        meta (str): The META_LEARNERS entry used by the returned ensemble (default is 'linear_positive').
+        model_results (pd.DataFrame, optional): Results that the base models' full fits are added to.
+        **options: folds, cache_dir, n_jobs and fold options passed to `base_predictions`.
+
+    Returns:
+        ensemble (StackingEnsemble): The fitted ensemble.
+        comparison (pd.DataFrame): Validation metrics of the base models and every blend.
+        model_results (pd.DataFrame): The results table.
+
+    Example:
+        ensemble, comparison, results = build_stack(X_train, y_train, X_val, y_val)
+        results = test_model(ensemble, X_test, y_test, results)
+    """
+    specs = BASE_SPECS if specs is None else specs
+    oof, val_preds, models, model_results = base_predictions(specs, X_train, y_train, X_val, y_val,
+                                                             model_results=model_results, **options)
+    comparison, metas = compare_blends(oof, y_train, val_preds, y_val)
+
+    return StackingEnsemble(models, metas[meta]), comparison, model_results
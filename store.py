@@ -0,0 +1,139 @@
+import json
+import sqlite3
+import time
+
+import pandas as pd
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+# Columns of the runs table, in order
+RUN_COLUMNS = {
+    'run_id': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+    'logged_at': 'REAL',
+    'model': 'TEXT',
+    'feature_set': 'TEXT',
+    'params': 'TEXT',
+    'data_fingerprint': 'TEXT',
+    'train_rmse': 'REAL',
+    'val_rmse': 'REAL',
+    'test_rmse': 'REAL',
+    'test_rmse_low': 'REAL',
+    'test_rmse_high': 'REAL',
+    'test_rmse_diff': 'REAL',
+    'diff_low': 'REAL',
+    'diff_high': 'REAL',
+    'split': 'TEXT',
+    'mae': 'REAL',
+    'r2': 'REAL',
+    'max_error': 'REAL',
+    'rmse_low': 'REAL',
+    'rmse_med': 'REAL',
+    'rmse_high': 'REAL',
+    'best_iteration': 'INTEGER',
+    'fit_time': 'REAL',
+    'predict_time': 'REAL',
+    'peak_mem_mb': 'REAL',
+    'timing_traced': 'INTEGER',
+}
+
+
+class ExperimentStore:
+    """
+    Append-only SQLite store of model runs with numeric metrics.
+
+    Parameters:
+        path (str): The SQLite database file (default is 'experiments.db'); ':memory:' keeps it in memory.
+
+    Note:
+        - Each run is one INSERT, so logging stays constant-time however long a sweep gets.
+        - Pass a store as `model_results` to `train_model`, `train_hyper` or `test_model` to log
+          every call; `results()` gives back the familiar results table.
+
+    Example:
+        store = ExperimentStore()
+        rforest, store = train_model(RandomForestRegressor, X_train, y_train, X_val, y_val, store)
+        store.best_per_feature_set()
+    """
+
+    def __init__(self, path='experiments.db'):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+
+        columns = ', '.join(f'{name} {sql_type}' for name, sql_type in RUN_COLUMNS.items())
+        self.connection.execute(f'CREATE TABLE IF NOT EXISTS runs ({columns})')
+
+        # Stores created before a column existed get it added, so older databases keep working
+        existing = {row[1] for row in self.connection.execute('PRAGMA table_info(runs)')}
+        for name, sql_type in RUN_COLUMNS.items():
+            if name not in existing:
+                self.connection.execute(f'ALTER TABLE runs ADD COLUMN {name} {sql_type}')
+
+        self.connection.execute('CREATE INDEX IF NOT EXISTS runs_feature_set ON runs (feature_set, val_rmse)')
+        self.connection.commit()
+
+    def log_run(self, **fields):
+        """
+        Append one run.
+
+        Parameters:
+            **fields: Any of the RUN_COLUMNS (except run_id); params may be a dict.
+
+        Returns:
+            int: The new run_id.
+        """
+        unknown = set(fields) - set(RUN_COLUMNS)
+        if unknown:
+            raise ValueError(f'Unknown run fields: {sorted(unknown)}')
+
+        fields.setdefault('logged_at', time.time())
+        if isinstance(fields.get('params'), dict):
+            fields['params'] = json.dumps(fields['params'], sort_keys=True, default=repr)
+
+        names = ', '.join(fields)
+        placeholders = ', '.join('?' for _ in fields)
+        cursor = self.connection.execute(f'INSERT INTO runs ({names}) VALUES ({placeholders})', list(fields.values()))
+        self.connection.commit()
+        return cursor.lastrowid
+
+    def query(self, sql, params=()):
+        """
+        Run any SQL query against the store and return a DataFrame.
+        """
+        return pd.read_sql_query(sql, self.connection, params=params)
+
+    def runs(self):
+        """
+        Every run, oldest first.
+        """
+        return self.query('SELECT * FROM runs ORDER BY run_id')
+
+    def results(self):
+        """
+        The runs in the shape of the `train_model` results table (Model, Train_RMSE, Val_RMSE, Test_RMSE).
+        """
+        return self.query('SELECT model AS Model, train_rmse AS Train_RMSE, val_rmse AS Val_RMSE, '
+                          'test_rmse AS Test_RMSE FROM runs ORDER BY run_id')
+
+    def best_per_feature_set(self, metric='val_rmse'):
+        """
+        The run with the lowest `metric` for every feature set.
+
+        Parameters:
+            metric (str): 'val_rmse', 'train_rmse' or 'test_rmse' (default is 'val_rmse').
+
+        Returns:
+            pd.DataFrame: One row per feature set.
+        """
+        if metric not in ('val_rmse', 'train_rmse', 'test_rmse'):
+            raise ValueError(f'Unknown metric: {metric}')
+
+        return self.query(f"""
+            SELECT * FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY feature_set ORDER BY {metric}) AS rank
+                FROM runs WHERE {metric} IS NOT NULL
+            ) WHERE rank = 1 ORDER BY {metric}
+        """).drop(columns='rank')
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,198 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from wrangle import acquire_wine
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+# The eleven chemistry measurements plus the quality grade, modelled jointly per wine type
+FEATURES = ['fixed_acidity', 'volatile_acidity', 'citric_acid', 'residual_sugar', 'chlorides',
+            'free_sulfur_dioxide', 'total_sulfur_dioxide', 'density', 'ph', 'sulphates', 'alcohol', 'quality']
+
+
+class WineCopula:
+    """
+    Gaussian copula of the wine chemistry and quality, fitted separately for each wine type.
+
+    Parameters:
+        df (pd.DataFrame, optional): Wine data shaped like `acquire_wine` output. Default is None,
+            which reads the CSVs.
+
+    Note:
+        - Each column keeps its empirical distribution (sampled by inverse CDF), and the
+          dependence between columns comes from the correlation of their normal scores.
+        - Quality is sampled from its observed grades only; measurements are interpolated
+          between observed values and rounded to the precision of the source data.
+    """
+
+    def __init__(self, df=None):
+        if df is None:
+            df = acquire_wine()
+
+        # Match the column spelling to `acquire_wine` (e.g. 'pH' becomes 'ph')
+        df = df.rename(columns=str.lower)
+        self.columns = [col for col in FEATURES if col in df.columns]
+        self.discrete = [df[col].dtype.kind in 'iu' for col in self.columns]
+        self.decimals = [_decimals(df[col]) for col in self.columns]
+
+        self.types = sorted(df['type'].unique())
+        self.type_share = df['type'].value_counts(normalize=True).reindex(self.types).to_numpy()
+
+        self.sorted_values = {}
+        self.cholesky = {}
+        for wine_type in self.types:
+            values = df.loc[df['type'] == wine_type, self.columns].to_numpy(dtype=float)
+            n = len(values)
+
+            # Normal scores of the ranks, then their correlation
+            ranks = values.argsort(axis=0).argsort(axis=0)
+            scores = norm.ppf((ranks + 1) / (n + 1))
+            corr = np.corrcoef(scores, rowvar=False)
+
+            # A small ridge keeps the factorisation stable when columns are nearly collinear
+            self.cholesky[wine_type] = np.linalg.cholesky(corr + 1e-6 * np.eye(len(self.columns)))
+            self.sorted_values[wine_type] = np.sort(values, axis=0)
+
+    def sample(self, n_rows, seed=42):
+        """
+        Draw synthetic rows.
+
+        Parameters:
+            n_rows (int): Number of rows to draw.
+            seed (int or list): Random seed (default is 42).
+
+        Returns:
+            pd.DataFrame: Rows with the modelled columns plus 'type', in `acquire_wine` order.
+        """
+        rng = np.random.default_rng(seed)
+        counts = rng.multinomial(n_rows, self.type_share)
+
+        frames = []
+        for wine_type, count in zip(self.types, counts):
+            # Correlated normals, mapped to uniforms and then through each column's empirical quantiles
+            uniforms = norm.cdf(rng.standard_normal((count, len(self.columns))) @ self.cholesky[wine_type].T)
+            observed = self.sorted_values[wine_type]
+            n = len(observed)
+
+            columns = {}
+            for i, col in enumerate(self.columns):
+                if self.discrete[i]:
+                    # Step inverse CDF: only grades that were actually given
+                    columns[col] = observed[np.minimum((uniforms[:, i] * n).astype(int), n - 1), i].astype(int)
+                else:
+                    # Interpolate between neighbouring observed values
+                    position = uniforms[:, i] * (n - 1)
+                    columns[col] = np.round(np.interp(position, np.arange(n), observed[:, i]), self.decimals[i])
+
+            frame = pd.DataFrame(columns)
+            frame['type'] = wine_type
+            frames.append(frame)
+
+        # Shuffle so the types are interleaved as in a real lab log
+        df = pd.concat(frames, ignore_index=True)
+        return df.iloc[rng.permutation(len(df))].reset_index(drop=True)
+
+
+def _decimals(series, max_decimals=6):
+    # Fewest decimals that reproduce every value of the column
+    values = series.to_numpy(dtype=float)
+    for decimals in range(max_decimals + 1):
+        if np.allclose(np.round(values, decimals), values, rtol=0, atol=1e-9):
+            return decimals
+    return max_decimals
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def _chunk_sizes(n_rows, chunksize):
+    # Sizes of the chunks making up n_rows
+    return [min(chunksize, n_rows - start) for start in range(0, n_rows, chunksize)]
+
+
+def synthetic_wine_chunks(n_rows, chunksize=100_000, seed=42, copula=None):
+    """
+    Stream synthetic wine rows in chunks.
+
+    Parameters:
+        n_rows (int): Total number of rows.
+        chunksize (int): Rows per chunk (default is 100,000).
+        seed (int): Random seed (default is 42).
+        copula (WineCopula, optional): A fitted copula. Default is None, which fits one to the CSVs.
+
+    Returns:
+        generator: Yields DataFrames shaped like `acquire_wine` output.
+
+    Note:
+        - Chunk i is drawn with seed (seed, i), so the rows depend only on the seed and chunk
+          size, never on how many workers produce them.
+    """
+    copula = WineCopula() if copula is None else copula
+    for i, size in enumerate(_chunk_sizes(n_rows, chunksize)):
+        yield copula.sample(size, seed=[seed, i])
+
+
+def _write_chunk(copula, size, seed, i, path):
+    # Worker: draw chunk i and write it as its own parquet part
+    chunk = copula.sample(size, seed=[seed, i])
+    chunk.to_parquet(os.path.join(path, f'part-{i:05d}.parquet'), index=False)
+    return len(chunk)
+
+
+def _sample_chunk(copula, size, seed, i):
+    # Worker: draw chunk i and hand it back for the CSV writer
+    return copula.sample(size, seed=[seed, i])
+
+
+def generate_wine(n_rows, path, chunksize=100_000, seed=42, n_jobs=None, copula=None):
+    """
+    Write any number of synthetic wine rows to CSV or parquet, in parallel chunks.
+
+    Parameters:
+        n_rows (int): Total number of rows.
+        path (str): A '.csv' file, or a directory of parquet parts for any other path.
+        chunksize (int): Rows per chunk (default is 100,000).
+        seed (int): Random seed (default is 42).
+        n_jobs (int, optional): Worker processes. Default is None (one per CPU).
+        copula (WineCopula, optional): A fitted copula. Default is None, which fits one to the CSVs.
+
+    Returns:
+        int: The number of rows written.
+
+    Note:
+        - The output is identical for any `n_jobs`; see `synthetic_wine_chunks`.
+        - CSV chunks are appended in order by this process while workers draw the next ones, with
+          at most two chunks per worker in flight. Parquet parts are written by the workers
+          and can be read back with `pd.read_parquet(path)`.
+
+    Example:
+        generate_wine(10_000_000, 'synthetic_wine.csv')
+        for chunk in acquire_wine_chunks(files={'synthetic': 'synthetic_wine.csv'}): ...
+    """
+    copula = WineCopula() if copula is None else copula
+    sizes = _chunk_sizes(n_rows, chunksize)
+    n_jobs = os.cpu_count() if n_jobs is None else n_jobs
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        if not path.endswith('.csv'):
+            os.makedirs(path, exist_ok=True)
+            return sum(pool.map(_write_chunk, [copula] * len(sizes), sizes, [seed] * len(sizes),
+                                range(len(sizes)), [path] * len(sizes)))
+
+        # Keep a bounded window of chunks in flight so memory stays flat for any n_rows
+        window = 2 * n_jobs
+        pending = [pool.submit(_sample_chunk, copula, size, seed, i) for i, size in enumerate(sizes[:window])]
+        written = 0
+        with open(path, 'w', newline='') as f:
+            for i in range(len(sizes)):
+                chunk = pending.pop(0).result()
+                if i + window < len(sizes):
+                    pending.append(pool.submit(_sample_chunk, copula, sizes[i + window], seed, i + window))
+                chunk.to_csv(f, header=(i == 0), index=False)
+                written += len(chunk)
+
+    return written
@@ -0,0 +1,117 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sklearn.ensemble import RandomForestRegressor
+
+from wrangle import acquire_wine
+from explore import WinePrep
+from flat_forest import compile_forest, FlatForest
+from profile_report import QuantileSketch, _merge_moments, _chunk_moments
+from cache import PredictionCache
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+@pytest.fixture(scope='module')
+def wine():
+    # The wine CSVs are read from the working directory, as everywhere else in the repo
+    if not os.path.exists('winequality-red.csv') or not os.path.exists('winequality-white.csv'):
+        pytest.skip('wine CSVs not found in the working directory')
+    return acquire_wine()
+
+
+@pytest.fixture(scope='module')
+def forest(wine):
+    # A small forest on the prepared features, plus rows it has not seen
+    prep = WinePrep().fit(wine.iloc[:4000])
+    X_train, y_train = prep.transform(wine.iloc[:4000]), wine['quality'].iloc[:4000]
+    X_test = prep.transform(wine.iloc[4000:])
+    model = RandomForestRegressor(n_estimators=30, max_depth=12, random_state=42).fit(X_train, y_train)
+    return model, X_test
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def test_flat_forest_matches_sklearn(forest):
+    model, X_test = forest
+    flat = compile_forest(model)
+    np.testing.assert_allclose(flat.predict(X_test), model.predict(X_test))
+    np.testing.assert_allclose(flat.predict(X_test, batch_size=100, n_jobs=4), model.predict(X_test))
+
+
+def test_flat_forest_save_load(forest, tmp_path):
+    model, X_test = forest
+    compile_forest(model).save(str(tmp_path))
+    flat = FlatForest.load(str(tmp_path))
+    np.testing.assert_allclose(flat.predict(X_test), model.predict(X_test))
+
+
+def test_flat_forest_subset(forest):
+    model, X_test = forest
+    trees = [3, 0, 7]
+    subset = compile_forest(model).subset(trees)
+    expected = np.mean([model.estimators_[tree].predict(X_test.to_numpy(dtype=np.float32)) for tree in trees], axis=0)
+    assert subset.n_trees == len(trees)
+    np.testing.assert_allclose(subset.predict(X_test), expected)
+
+
+def test_flat_forest_cap_depth(forest):
+    model, X_test = forest
+    flat = compile_forest(model)
+    capped = flat.cap_depth(4)
+    assert capped.node_depths().max() <= 4
+    assert capped.n_nodes < flat.n_nodes
+    # Capping deeper than any tree changes nothing
+    np.testing.assert_allclose(flat.cap_depth(100).predict(X_test), flat.predict(X_test))
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def test_merged_moments_match_single_pass(wine):
+    X = wine.select_dtypes(include='number').to_numpy(dtype=float)
+    X[::7, 2] = np.nan
+
+    merged = _merge_moments(_chunk_moments(X[:2500]), _chunk_moments(X[2500:]))
+    for merged_part, single_part in zip(merged, _chunk_moments(X)):
+        np.testing.assert_allclose(merged_part, single_part, rtol=1e-9)
+
+
+def test_merged_sketch_matches_single_pass(wine):
+    values = wine['total_sulfur_dioxide'].to_numpy(dtype=float)
+    quantiles = np.array([0.1, 0.25, 0.5, 0.75, 0.9])
+
+    merged = QuantileSketch(seed=0).update(values[:3000]).merge(QuantileSketch(seed=1).update(values[3000:]))
+    single = QuantileSketch(seed=0).update(values)
+
+    # Both stay within the sketch's rank error of the exact quantiles
+    for sketch in (merged, single):
+        ranks = np.searchsorted(np.sort(values), sketch.quantile(quantiles)) / len(values)
+        np.testing.assert_allclose(ranks, quantiles, atol=0.03)
+
+# -----------------------------------------------------------------------------------------------
+# -----------------------------------------------------------------------------------------------
+
+def test_prediction_cache_hits_and_misses(forest):
+    model, X_test = forest
+    cached = PredictionCache(model)
+    batch = X_test.iloc[:50]
+
+    np.testing.assert_allclose(cached.predict(batch), model.predict(batch))
+    assert cached.stats()['misses'] == len(batch)
+
+    # A batch with 10 seen rows and 10 new ones, in shuffled column order
+    mixed = pd.concat([X_test.iloc[40:60], X_test.iloc[40:50]])[X_test.columns[::-1]]
+    np.testing.assert_allclose(cached.predict(mixed), model.predict(mixed[X_test.columns]))
+    stats = cached.stats()
+    assert stats['hits'] == 20
+    assert stats['misses'] == len(batch) + 10
+
+
+def test_wine_prep_round_trip(wine):
+    prep = WinePrep(new_features=True, scale=True, cluster=True).fit(wine)
+    restored = WinePrep.from_dict(json.loads(json.dumps(prep.to_dict())))
+    pd.testing.assert_frame_equal(restored.transform(wine.iloc[:500]), prep.transform(wine.iloc[:500]))
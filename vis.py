@@ -3,9 +3,21 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-from explore import cluster_alc_dens, new_feats, cluster_two
+from explore import cluster_alc_dens, new_feats, cluster_two, grouped_stats, sample_frame, sample_note
+
+def annotate_sample(df):
+    # Note the sample size in the corner of the figure when the global exploration sample is on
+    if sample_note(df):
+        plt.figtext(0.99, 0.01, sample_note(df).capitalize(), ha='right', va='bottom', fontsize=9, color='gray')
+
+# ---------------------------------------------------------------------------------------------------------------------------------------
+
+# ---------------------------------------------------------------------------------------------------------------------------------------
 
 def quality_distribution(df):
+    # Use the global exploration sample, if one is configured
+    df = sample_frame(df)
+
     # count the values for each quality category
     quality_counts = df['quality'].value_counts().sort_index()
     # create the plot
@@ -40,6 +52,7 @@ def quality_distribution(df):
     # Use plt.tight_layout() to ensure proper spacing
     plt.tight_layout()
     
+    annotate_sample(df)
     plt.show()
 
 # ---------------------------------------------------------------------------------------------------------------------------------------
@@ -47,15 +60,18 @@ def quality_distribution(df):
 # ---------------------------------------------------------------------------------------------------------------------------------------
 
 def alcohol_distribution(df):
+    # Use the global exploration sample, if one is configured
+    df = sample_frame(df)
+
     # Define the bin edges and labels
     bin_edges = [8, 9, 10, 11, 12, 14]
     bin_labels = ['8-9', '9-10', '10-11', '11-12', '12-14']
 
-    # Bin the 'alcohol' values
-    df['alcohol_bins'] = pd.cut(df['alcohol'], bins=bin_edges, labels=bin_labels, include_lowest=True)
+    # Bin the 'alcohol' values (without adding a column to the caller's frame)
+    alcohol_bins = pd.cut(df['alcohol'], bins=bin_edges, labels=bin_labels, include_lowest=True)
 
     # Count the values in each bin
-    alcohol_counts = df['alcohol_bins'].value_counts().sort_index()
+    alcohol_counts = alcohol_bins.value_counts().sort_index()
 
     plt.figure(figsize=(4, 5))
     ax = plt.bar(alcohol_counts.index, alcohol_counts.values,  color='lightseagreen')
@@ -76,25 +92,21 @@ def alcohol_distribution(df):
     plt.title('Distribution of Alcohol')
     plt.xticks(alcohol_counts.index)
 
-    # Remove the "quality_bins" column from the DataFrame
-    df.drop(columns=['alcohol_bins'], inplace=True)
-
+    annotate_sample(df)
     plt.show()
 
 # ---------------------------------------------------------------------------------------------------------------------------------------
 
 # ---------------------------------------------------------------------------------------------------------------------------------------
 
-def alcohol_vs_quanity(df):
-    # Define custom labels for "quality"
-    bins_q = [3, 5, 6, 9]
-    labels_q = ['Low', 'Med', 'High']
+def alcohol_vs_quanity(df, stats=None):
+    # Use the global exploration sample, if one is configured
+    df = sample_frame(df)
 
-    # Create a new column "quality_bins" to store the bin labels
-    df['quality_bins'] = pd.cut(df['quality'], bins=bins_q, labels=labels_q)
-
-    # Group the data by "quality" and calculate the mean alcohol content for each quality category
-    quality_means = df.groupby('quality_bins')['alcohol'].mean().round(1)
+    # Read the per-tier means from the grouped statistics (pass `stats` to share one computation)
+    if stats is None:
+        stats = grouped_stats(df)
+    quality_means = stats['alcohol']['mean'].round(1)
 
     # Create a bar plot
     plt.figure(figsize=(6, 6))
@@ -121,29 +133,25 @@ def alcohol_vs_quanity(df):
 
     plt.ylim(8, 13)
 
-    # Remove the "quality_bins" column from the DataFrame
-    df.drop(columns=['quality_bins'], inplace=True)
-
     # Use plt.tight_layout() to ensure proper spacing
     plt.tight_layout()
 
     # Show the plot
+    annotate_sample(df)
     plt.show()
 
 # ---------------------------------------------------------------------------------------------------------------------------------------
 
 # ---------------------------------------------------------------------------------------------------------------------------------------
 
-def density_vs_quantity(df):
-    # Define custom labels for "quality"
-    bins_q = [3, 5, 6, 9]
-    labels_q = ['Low', 'Med', 'High']
+def density_vs_quantity(df, stats=None):
+    # Use the global exploration sample, if one is configured
+    df = sample_frame(df)
 
-    # Create a new column "quality_bins" to store the bin labels
-    df['quality_bins'] = pd.cut(df['quality'], bins=bins_q, labels=labels_q)
-
-    # Group the data by "quality" and calculate the mean alcohol content for each quality category
-    quality_means = df.groupby('quality_bins')['density'].mean().round(6)
+    # Read the per-tier means from the grouped statistics (pass `stats` to share one computation)
+    if stats is None:
+        stats = grouped_stats(df)
+    quality_means = stats['density']['mean'].round(6)
 
     # Create a bar plot
     plt.figure(figsize=(6, 6))
@@ -170,28 +178,24 @@ def density_vs_quantity(df):
 
     plt.ylim(0.98711, 1)
 
-    # Remove the "quality_bins" column from the DataFrame
-    df.drop(columns=['quality_bins'], inplace=True)
-
     # Use plt.tight_layout() to ensure proper spacing
     plt.tight_layout()
     # Show the plot
+    annotate_sample(df)
     plt.show()
 
 # ---------------------------------------------------------------------------------------------------------------------------------------
 
 # ---------------------------------------------------------------------------------------------------------------------------------------
 
-def v_acidity_vs_quantity(df):
-    # Define custom labels for "quality"
-    bins_q = [3, 5, 6, 9]
-    labels_q = ['Low', 'Med', 'High']
+def v_acidity_vs_quantity(df, stats=None):
+    # Use the global exploration sample, if one is configured
+    df = sample_frame(df)
 
-    # Create a new column "quality_bins" to store the bin labels
-    df['quality_bins'] = pd.cut(df['quality'], bins=bins_q, labels=labels_q)
-
-    # Group the data by "quality" and calculate the mean alcohol content for each quality category
-    quality_means = df.groupby('quality_bins')['volatile_acidity'].mean().round(6)
+    # Read the per-tier means from the grouped statistics (pass `stats` to share one computation)
+    if stats is None:
+        stats = grouped_stats(df)
+    quality_means = stats['volatile_acidity']['mean'].round(6)
 
     # Create a bar plot
     plt.figure(figsize=(6, 6))
@@ -218,15 +222,16 @@ def v_acidity_vs_quantity(df):
     
     plt.ylim(0.1, .5)
 
-    # Remove the "quality_bins" column from the DataFrame
-    df.drop(columns=['quality_bins'], inplace=True)
-
     # Use plt.tight_layout() to ensure proper spacing
     plt.tight_layout()
     # Show the plot
+    annotate_sample(df)
     plt.show()
 
 def qual_cluster(df):
+    # Use the global exploration sample, if one is configured
+    df = sample_frame(df)
+
     
     df = cluster_alc_dens(df)
     # Define a custom legend labels dictionary
@@ -260,9 +265,13 @@ def qual_cluster(df):
     # Show the plot
     
     # Show the plot
+    annotate_sample(df)
     plt.show()
 
 def cluster_two_plt(df):
+    # Use the global exploration sample, if one is configured
+    df = sample_frame(df)
+
     df = new_feats(df)
     df = cluster_two(df)
     plt.figure(figsize=(8, 6))
@@ -271,4 +280,5 @@ def cluster_two_plt(df):
     plt.xlabel('Total Acidity')
     plt.ylabel('Alcohol by Density')
     plt.legend().set_visible(False)
+    annotate_sample(df)
     plt.show()
\ No newline at end of file
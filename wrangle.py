@@ -1,4 +1,5 @@
 # Import the pandas library
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
 
@@ -22,6 +23,63 @@ def acquire_wine():
     
     return df
 
+def acquire_wine_chunks(chunksize=100_000, files=None):
+    """
+    Stream the wine CSVs in chunks instead of reading them fully into memory.
+
+    Parameters:
+        chunksize (int): Number of rows per chunk (default is 100,000).
+        files (dict, optional): Mapping of wine type to CSV path. Default is None, which reads
+            'winequality-red.csv' and 'winequality-white.csv'. Files that already have a 'type'
+            column, such as the output of `synthetic.generate_wine`, keep their own.
+
+    Returns:
+        generator: Yields DataFrames with the same columns as `acquire_wine`.
+    """
+    if files is None:
+        files = {'red': 'winequality-red.csv', 'white': 'winequality-white.csv'}
+
+    for wine_type, path in files.items():
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            # Clean up the column names like acquire_wine and assign the wine type if the file has none
+            chunk.columns = [col.lower().replace(' ', '_').replace('.', '_') for col in chunk.columns]
+            if 'type' not in chunk.columns:
+                chunk['type'] = wine_type
+
+            yield chunk
+
+def compact_wine(df, count_col='n_copies', verbose=True):
+    """
+    Collapse exact duplicate rows into unique rows with a count column.
+
+    Parameters:
+        df (pd.DataFrame): The acquired wine data.
+        count_col (str): Name of the column that stores how many copies each row had (default is 'n_copies').
+        verbose (bool): Print the reduction in rows (default is True).
+
+    Returns:
+        pd.DataFrame: One row per distinct wine, in order of first appearance, with the count column.
+
+    Note:
+        - Rows are matched on a 64-bit hash of every column, so the whole frame is hashed once.
+        - Compact before splitting so all copies of a wine land in the same split (no train/test leakage).
+        - Pass the count column as `sample_weight` so weighted fits match fits on the full data.
+    """
+    # Hash every row and give each distinct hash an integer code
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    codes, _ = pd.factorize(row_hashes)
+
+    # Keep the first copy of each distinct row and count the copies
+    _, first_rows = np.unique(codes, return_index=True)
+    compacted = df.iloc[first_rows].copy()
+    compacted[count_col] = np.bincount(codes)
+
+    if verbose:
+        print(f'Compacted {len(df):,} rows to {len(compacted):,} unique rows '
+              f'({1 - len(compacted) / len(df):.1%} fewer).')
+
+    return compacted
+
 # def prepare_wine(df):
 #     df.columns = [col.lower().replace(' ', '_').replace('.', '_') for col in df.columns]
 #     return df